@@ -0,0 +1,154 @@
+"""
+Anytime Schedule Improvement
+============================
+
+Local search that spends whatever is left of optimize_schedule's deadline
+improving the greedy plan:
+- Swap line: move a conflicting train to one of its alternative lines
+- Re-space: move a conflicting train just clear of its neighbour
+- Re-time: pull a train back towards its original position
+- Pull back: move a displaced train towards its original position, but
+  stop short of the next train on its line (headway + CLEARANCE_MARGIN),
+  so the move never creates a violation
+- Moves are kept when they do not make the plan worse, and the best plan
+  seen is restored when time runs out
+
+Plans are scored on the columns only (positions, line codes, timestamp
+groups), with headway violations dominating the score and priority-
+weighted displacement and line changes as in exact_solver breaking ties.
+"""
+
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from main import RailwayOptimizer, EventType, logger
+from encoding import LINES, LINE_CODES, CONFIG_TABLE, TRAIN_TYPE_CODES
+from exact_solver import REROUTE_PENALTY_MINUTES, MIN_SPEED_KMPH
+
+VIOLATION_PENALTY = 100.0  # objective cost of one headway violation
+RETIME_FRACTION = 0.5  # share of the displacement undone by a re-time move
+CLEARANCE_MARGIN = 1.0  # meters kept beyond the headway by re-space and pull-back moves
+
+
+class PlanState:
+    """Snapshot of the fields the search changes, as arrays"""
+
+    def __init__(self, optimizer: RailwayOptimizer):
+        trains = list(optimizer.trains.values())
+        self.trains = trains
+        self.position = np.array([t.current_position for t in trains], dtype=np.float64)
+        self.line = np.array([LINE_CODES[t.current_line] for t in trains], dtype=np.int8)
+        _, self.group = np.unique(np.array([t.timestamp for t in trains], dtype='datetime64[ns]'),
+                                  return_inverse=True)
+        weight = 6 - CONFIG_TABLE['priority'][[TRAIN_TYPE_CODES[t.train_type] for t in trains]]
+        speed = np.maximum([t.current_speed for t in trains], MIN_SPEED_KMPH)
+        self.weight = weight.astype(np.float64)
+        self.minutes_per_meter = 60 / (speed * 1000)
+
+
+def baseline(optimizer: RailwayOptimizer) -> Dict[str, np.ndarray]:
+    """Positions and lines before optimization, the reference for displacement costs"""
+    state = PlanState(optimizer)
+    return {'position': state.position, 'line': state.line}
+
+
+def _violation_pairs(state: PlanState, position: np.ndarray, line: np.ndarray,
+                     headway: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort order, and indices into it of adjacent same-group same-line pairs closer than headway"""
+    order = np.lexsort((position, line, state.group))
+    same = (state.group[order][1:] == state.group[order][:-1]) & (line[order][1:] == line[order][:-1])
+    close = same & (np.diff(position[order]) < headway)
+    return order, np.flatnonzero(close)
+
+
+def _pull_back(state: PlanState, position: np.ndarray, line: np.ndarray, k: int, target: float,
+               clearance: float) -> float:
+    """Position between k's current one and target, short of the next same-group same-line train"""
+    direction = np.sign(target - position[k])
+    ahead = (state.group == state.group[k]) & (line == line[k]) & (direction * (position - position[k]) > 0)
+    if not ahead.any():
+        return target
+    nearest = position[ahead][np.argmin(np.abs(position[ahead] - position[k]))]
+    room = max(abs(nearest - position[k]) - clearance, 0.0)
+    return position[k] + direction * min(abs(target - position[k]), room)
+
+
+def objective(state: PlanState, reference: Dict[str, np.ndarray], position: np.ndarray,
+              line: np.ndarray, headway: float) -> float:
+    _, pairs = _violation_pairs(state, position, line, headway)
+    displacement = np.abs(position - reference['position']) * state.minutes_per_meter
+    rerouted = (line != reference['line']) * REROUTE_PENALTY_MINUTES
+    return float(VIOLATION_PENALTY * len(pairs) + (state.weight * (displacement + rerouted)).sum())
+
+
+def improve_schedule(optimizer: RailwayOptimizer, reference: Dict[str, np.ndarray],
+                     deadline: float, started: float, seed: int = 0) -> Dict:
+    """Local search on the current plan until the perf_counter deadline; applies the best plan"""
+    rng = np.random.default_rng(seed)
+    state = PlanState(optimizer)
+    headway = optimizer.headway_minimum
+    topology = optimizer.topology
+
+    position = state.position.copy()
+    line = state.line.copy()
+    current = objective(state, reference, position, line, headway)
+    greedy_objective = best = current
+    best_position, best_line = position.copy(), line.copy()
+    trace: List[Dict] = [{'elapsed_seconds': time.perf_counter() - started, 'objective': best}]
+    iterations = 0
+
+    while time.perf_counter() < deadline:
+        iterations += 1
+        order, pairs = _violation_pairs(state, position, line, headway)
+        if len(pairs):
+            pair = pairs[rng.integers(len(pairs))]
+            leader, follower = order[pair], order[pair + 1]
+            k = leader if state.weight[leader] < state.weight[follower] else follower
+        else:
+            # Only trains off their original position or line can lower the cost
+            displaced = np.flatnonzero((position != reference['position']) | (line != reference['line']))
+            k = displaced[rng.integers(len(displaced))] if len(displaced) else rng.integers(len(position))
+
+        old_position, old_line = position[k], line[k]
+        move = rng.integers(4)
+        alternatives = topology.alternative_lines(LINES[old_line], old_position) if move == 0 else []
+        if alternatives:
+            line[k] = LINE_CODES[alternatives[rng.integers(len(alternatives))]]
+        elif move == 1 and len(pairs):
+            # Step clear of the other train of the pair, ahead or behind
+            other = follower if k == leader else leader
+            side = -1 if rng.random() < 0.5 else 1
+            position[k] = np.clip(position[other] + side * (headway + CLEARANCE_MARGIN), 0, optimizer.track_length)
+        elif move == 3:
+            position[k] = _pull_back(state, position, line, k, reference['position'][k], headway + CLEARANCE_MARGIN)
+        else:
+            position[k] += RETIME_FRACTION * (reference['position'][k] - position[k])
+
+        candidate = objective(state, reference, position, line, headway)
+        if candidate <= current:
+            current = candidate
+            if candidate < best:
+                best = candidate
+                best_position, best_line = position.copy(), line.copy()
+                trace.append({'elapsed_seconds': time.perf_counter() - started, 'objective': best})
+        else:
+            position[k], line[k] = old_position, old_line
+
+    for k, train in enumerate(state.trains):
+        train.current_position = float(best_position[k])
+        if best_line[k] != state.line[k]:
+            new_line = LINES[best_line[k]]
+            train.route_history.append(new_line)
+            optimizer._set_train_state(train, new_line, EventType.REROUTED)
+
+    trace.append({'elapsed_seconds': time.perf_counter() - started, 'objective': best})
+    logger.info(f"Local search: {iterations} moves, objective {greedy_objective:.2f} -> {best:.2f}")
+    return {
+        'iterations': iterations,
+        'greedy_objective': greedy_objective,
+        'best_objective': best,
+        'improvement_percentage': (greedy_objective - best) / greedy_objective * 100 if greedy_objective else 0.0,
+        'trace': trace,
+    }
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Change-Log Output Format
+========================
+
+Compact on-disk form of a simulation or optimized dataset that stores a
+train's state only when it changes:
+- Presence runs: per train, the ranges of consecutive timestamps it has
+  records at (one run per train for optimized output)
+- Change rows: a train's line, event, station, delay, speed (every column
+  other than timestamp, train_id and position) at the records where any
+  of them differs from the train's previous record
+- Position segments: piecewise-linear runs of records, stored as a start
+  value and a per-record step; segments are split wherever start + step *
+  offset does not reproduce the original value bit for bit
+- Files: one .npy per array plus meta.json, written to a temporary
+  directory and swapped into place with the trajectory_archive.py helpers,
+  which only ever replace an existing change log
+
+ChangeLog.window(start, end) expands only the records in [start, end).
+Expanded frames are identical to the frame that was written, columns and
+dtypes included, with rows in timestamp order and trains in order of first
+appearance (the order the simulators and the optimizer write).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from fleet_cache import _frame_arrays, _rebuild_frame
+from trajectory_archive import read_meta, stage_directory, swap_directory
+
+CHANGE_LOG_VERSION = 1
+CHANGE_LOG_FORMAT = 'change_log'
+CHANGE_LOG_SUFFIX = '.changes'
+TIME_COLUMN = 'timestamp'
+TRAIN_COLUMN = 'train_id'
+LINEAR_COLUMNS = ('position_m',)
+
+
+def change_log_path_for(csv_path: str) -> str:
+    """Default change-log directory next to a CSV"""
+    return os.path.splitext(csv_path)[0] + CHANGE_LOG_SUFFIX
+
+
+def _bits(values: np.ndarray) -> np.ndarray:
+    """Values as unsigned integers, so equality is exact (NaN == NaN, -0.0 != 0.0)"""
+    return values.view(f'u{values.itemsize}')
+
+
+def _time_index(times: np.ndarray, column) -> np.ndarray:
+    """Encoded timestamp values as datetime64[ns] integers"""
+    name = column[0]
+    decoded = _rebuild_frame({f"frame.{name}": times}, [column])[name]
+    return pd.to_datetime(decoded).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _segments(values: np.ndarray, starts: np.ndarray):
+    """Split values into exact start + step * offset segments, beginning at starts"""
+    starts = starts.copy()
+    bits = _bits(values)
+    rows = np.arange(len(values))
+    while True:
+        first = np.flatnonzero(starts)
+        following = first + 1
+        has_next = following < len(values)
+        has_next[has_next] = ~starts[following[has_next]]
+        steps = np.zeros(len(first), dtype=values.dtype)
+        steps[has_next] = values[following[has_next]] - values[first[has_next]]
+        segment = np.cumsum(starts) - 1
+        offset = rows - first[segment]
+        expanded = _expand_segment(values[first][segment], steps[segment], offset)
+        wrong = _bits(expanded) != bits
+        if not wrong.any():
+            return first, values[first], steps
+        starts |= wrong
+
+
+def _expand_segment(start: np.ndarray, step: np.ndarray, offset: np.ndarray) -> np.ndarray:
+    return np.where(offset == 0, start, start + step * offset)
+
+
+def _save(path: str, arrays: Dict[str, np.ndarray], meta: Dict, started: float) -> Dict:
+    """Write the arrays and meta.json; returns the meta without column details, plus size and time
+
+    An existing path is only replaced if it is a change log (trajectory_archive.stage_directory).
+    """
+    staging = stage_directory(path, CHANGE_LOG_FORMAT, CHANGE_LOG_VERSION)
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), values, allow_pickle=False)
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    swap_directory(staging, path)
+    stats = {name: value for name, value in meta.items() if name != 'columns'}
+    stats['bytes'] = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def _meta(columns, rows: int, arrays: Dict[str, np.ndarray], linear: List[str]) -> Dict:
+    return {
+        'format': CHANGE_LOG_FORMAT,
+        'version': CHANGE_LOG_VERSION,
+        'rows': rows,
+        'columns': columns,
+        'linear': linear,
+        'timestamps': len(arrays['times']),
+        'trains': len(arrays['trains']),
+        'runs': len(arrays['run_train']),
+        'change_rows': len(arrays['change_row']),
+        'segments': {name: len(arrays[f'linear.{name}.row']) for name in linear},
+    }
+
+
+def write_change_log(df: pd.DataFrame, path: str) -> Dict:
+    """Write a frame as a change log; returns its counts, size and write time"""
+    started = time.perf_counter()
+    encoded, columns = _frame_arrays(df)
+    by_name = {column[0]: column for column in columns}
+    linear = [name for name in LINEAR_COLUMNS if name in by_name and df[name].dtype.kind == 'f']
+    steps = [name for name, _, _ in columns if name not in (TIME_COLUMN, TRAIN_COLUMN, *linear)]
+
+    # Timestamps in chronological order, trains in order of first appearance
+    times, time_code = np.unique(encoded[f'frame.{TIME_COLUMN}'], return_inverse=True)
+    chronological = np.argsort(_time_index(times, by_name[TIME_COLUMN]), kind='stable')
+    time_rank = np.empty_like(chronological)
+    time_rank[chronological] = np.arange(len(chronological))
+    trains, first_seen, train_code = np.unique(encoded[f'frame.{TRAIN_COLUMN}'], return_index=True,
+                                               return_inverse=True)
+    appearance = np.argsort(first_seen, kind='stable')
+    train_rank = np.empty_like(appearance)
+    train_rank[appearance] = np.arange(len(appearance))
+    k = time_rank[time_code]
+    train = train_rank[train_code]
+
+    # Records grouped by train, in time order within each train
+    order = np.lexsort((k, train))
+    k, train = k[order], train[order]
+    new_train = np.r_[True, train[1:] != train[:-1]][:len(order)]
+    new_run = new_train | np.r_[True, k[1:] != k[:-1] + 1][:len(order)]
+    run_first = np.flatnonzero(new_run)
+
+    changed = new_run.copy()
+    for name in steps:
+        values = _bits(encoded[f'frame.{name}'][order])
+        changed[1:] |= values[1:] != values[:-1]
+    change_row = np.flatnonzero(changed)
+
+    arrays = {
+        'times': times[chronological],
+        'trains': trains[appearance],
+        'run_train': train[run_first],
+        'run_time': k[run_first],
+        'run_length': np.diff(np.r_[run_first, len(order)]),
+        'change_row': change_row,
+    }
+    for name in steps:
+        arrays[f'values.{name}'] = encoded[f'frame.{name}'][order][change_row]
+    for name in linear:
+        values = encoded[f'frame.{name}'][order]
+        # Candidate breaks where the step into a record differs from the step into the one
+        # before (unless that one starts a run); _segments adds any needed for exactness
+        step_bits = _bits(np.diff(values))
+        step_changed = np.r_[False, False, step_bits[1:] != step_bits[:-1]][:len(values)]
+        step_changed[1:] &= ~new_run[:-1]
+        first, start, step = _segments(values, new_run | step_changed)
+        arrays[f'linear.{name}.row'] = first
+        arrays[f'linear.{name}.start'] = start
+        arrays[f'linear.{name}.step'] = step
+
+    return _save(path, arrays, _meta(columns, len(df), arrays, linear), started)
+
+
+def write_snapshot_change_log(snapshot: pd.DataFrame, timestamps: pd.Series, path: str) -> Dict:
+    """Change log of one snapshot of every train repeated at each of timestamps
+
+    The same file write_change_log gives for the tiled frame (e.g. the
+    optimizer's output), built without materializing it.
+    """
+    started = time.perf_counter()
+    encoded, columns = _frame_arrays(snapshot)
+    time_encoded, (time_column,) = _frame_arrays(timestamps.to_frame(TIME_COLUMN))
+    columns = [time_column if column[0] == TIME_COLUMN else column for column in columns]
+    by_name = {column[0]: column for column in columns}
+    linear = [name for name in LINEAR_COLUMNS if name in by_name and snapshot[name].dtype.kind == 'f']
+    steps = [name for name, _, _ in columns if name not in (TIME_COLUMN, TRAIN_COLUMN, *linear)]
+
+    times = np.unique(time_encoded[f'frame.{TIME_COLUMN}'])
+    times = times[np.argsort(_time_index(times, by_name[TIME_COLUMN]), kind='stable')]
+    n_trains, n_times = len(snapshot), len(times)
+    first = np.arange(n_trains, dtype=np.int64) * n_times
+
+    arrays = {
+        'times': times,
+        'trains': encoded[f'frame.{TRAIN_COLUMN}'],
+        'run_train': np.arange(n_trains, dtype=np.int64),
+        'run_time': np.zeros(n_trains, dtype=np.int64),
+        'run_length': np.full(n_trains, n_times, dtype=np.int64),
+        'change_row': first,
+    }
+    for name in steps:
+        arrays[f'values.{name}'] = encoded[f'frame.{name}']
+    for name in linear:
+        arrays[f'linear.{name}.row'] = first
+        arrays[f'linear.{name}.start'] = encoded[f'frame.{name}']
+        arrays[f'linear.{name}.step'] = np.zeros(n_trains, dtype=encoded[f'frame.{name}'].dtype)
+
+    return _save(path, arrays, _meta(columns, n_trains * n_times, arrays, linear), started)
+
+
+class ChangeLog:
+    """Reader for a change-log directory; expands records on demand"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = read_meta(path, CHANGE_LOG_FORMAT, CHANGE_LOG_VERSION)
+        self.columns = [tuple(column) for column in self.meta['columns']]
+        self.arrays = {name[:-len('.npy')]: np.load(os.path.join(path, name), allow_pickle=False)
+                       for name in os.listdir(path) if name.endswith('.npy')}
+        by_name = {column[0]: column for column in self.columns}
+        self.time_index = _time_index(self.arrays['times'], by_name[TIME_COLUMN])
+        self.run_row = np.r_[0, np.cumsum(self.arrays['run_length'])[:-1]].astype(np.int64)
+
+    def __len__(self) -> int:
+        return self.meta['rows']
+
+    @property
+    def time_range(self):
+        if not len(self.time_index):
+            return None, None
+        return pd.Timestamp(self.time_index[0]), pd.Timestamp(self.time_index[-1])
+
+    @property
+    def train_ids(self):
+        return list(_rebuild_frame({f'frame.{TRAIN_COLUMN}': self.arrays['trains']},
+                                   [column for column in self.columns if column[0] == TRAIN_COLUMN])[TRAIN_COLUMN])
+
+    def _time_position(self, when) -> int:
+        return int(np.searchsorted(self.time_index, pd.Timestamp(when).as_unit('ns').value, side='left'))
+
+    def window(self, start=None, end=None) -> pd.DataFrame:
+        """Records with start <= timestamp < end, expanded from the change log"""
+        first = 0 if start is None else self._time_position(start)
+        last = len(self.time_index) if end is None else self._time_position(end)
+        arrays = self.arrays
+
+        # Part of each presence run inside [first, last)
+        run_time, run_length = arrays['run_time'], arrays['run_length']
+        low = np.maximum(run_time, first)
+        counts = np.maximum(np.minimum(run_time + run_length, last) - low, 0)
+        run = np.repeat(np.arange(len(counts)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        k = low[run] + within
+        row = self.run_row[run] + (k - run_time[run])
+        train = arrays['run_train'][run]
+        order = np.lexsort((row, train, k))
+        k, row, train = k[order], row[order], train[order]
+
+        data = {f'frame.{TIME_COLUMN}': arrays['times'][k], f'frame.{TRAIN_COLUMN}': arrays['trains'][train]}
+        change = np.searchsorted(arrays['change_row'], row, side='right') - 1
+        for name, _, _ in self.columns:
+            if f'values.{name}' in arrays:
+                data[f'frame.{name}'] = arrays[f'values.{name}'][change]
+        for name in self.meta['linear']:
+            first_row = arrays[f'linear.{name}.row']
+            segment = np.searchsorted(first_row, row, side='right') - 1
+            data[f'frame.{name}'] = _expand_segment(arrays[f'linear.{name}.start'][segment],
+                                                    arrays[f'linear.{name}.step'][segment], row - first_row[segment])
+        return _rebuild_frame(data, self.columns)
+
+    def frame(self) -> pd.DataFrame:
+        """Every record"""
+        return self.window()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.arrays.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a simulation or optimized CSV to a change log")
+    parser.add_argument('input', help="simulation or optimized CSV")
+    parser.add_argument('--output', default=None, help=f"change-log directory (default: <input>{CHANGE_LOG_SUFFIX})")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    try:
+        stats = write_change_log(df, args.output or change_log_path_for(args.input))
+    except FileExistsError as e:
+        parser.error(str(e))
+    print(f" Wrote {stats['rows']} records of {stats['trains']} trains as {stats['change_rows']} change rows "
+          f"and {sum(stats['segments'].values())} position segments ({stats['bytes'] / 1e6:.2f} MB, "
+          f"CSV {os.path.getsize(args.input) / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
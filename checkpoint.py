@@ -0,0 +1,194 @@
+"""
+Run Checkpoints
+===============
+
+Periodic snapshots that let long optimizer and generator runs resume
+after a crash or preemption:
+- A checkpoint is a directory of .npy arrays, a pickled state blob and a
+  manifest.json naming the files of the latest complete checkpoint
+- Writes are incremental: each array's digest is kept and an array is only
+  rewritten when its contents changed, so a fleet of unchanged columns or
+  an append-only record log costs almost nothing to checkpoint again
+- The manifest is swapped in with an atomic rename after all files are
+  written, so a run killed mid-write leaves the previous checkpoint intact
+- save_optimizer/restore_optimizer capture the RailwayOptimizer state:
+  fleet columns, station platforms, conflicts, decision metrics, the
+  RNG state and how far optimize_schedule got
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+def _digest(array: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(array).view(np.uint8).data, digest_size=16).hexdigest()
+
+
+class CheckpointWriter:
+    """Writes checkpoints into a directory, rewriting only arrays that changed"""
+
+    def __init__(self, path: str, interval: float = 300.0):
+        self.path = path
+        self.interval = interval  # seconds between checkpoints (due())
+        self.generation = 0
+        self.files: Dict[str, str] = {}
+        self.digests: Dict[str, str] = {}
+        self.stats = {'checkpoints': 0, 'arrays_written': 0, 'arrays_unchanged': 0,
+                      'bytes_written': 0, 'write_seconds': 0.0}
+        self._last = time.perf_counter()
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def resume(cls, path: str, interval: float = 300.0) -> 'CheckpointWriter':
+        """Continue writing after the checkpoint in path"""
+        writer = cls(path, interval)
+        manifest = read_manifest(path)
+        writer.generation = manifest['generation']
+        writer.files = dict(manifest['arrays'])
+        writer.digests = dict(manifest['digests'])
+        return writer
+
+    def due(self) -> bool:
+        return time.perf_counter() - self._last >= self.interval
+
+    def write(self, arrays: Dict[str, np.ndarray], state) -> int:
+        """Checkpoint the given arrays and state; arrays not passed keep their last written copy"""
+        started = time.perf_counter()
+        self.generation += 1
+        stale = []
+        for name, array in arrays.items():
+            digest = _digest(array)
+            if self.digests.get(name) == digest:
+                self.stats['arrays_unchanged'] += 1
+                continue
+            filename = f"{name}.{self.generation}.npy"
+            np.save(os.path.join(self.path, filename), array, allow_pickle=False)
+            if name in self.files:
+                stale.append(self.files[name])
+            self.files[name] = filename
+            self.digests[name] = digest
+            self.stats['arrays_written'] += 1
+            self.stats['bytes_written'] += array.nbytes
+
+        state_file = f"state.{self.generation}.pkl"
+        blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(self.path, state_file), 'wb') as f:
+            f.write(blob)
+        self.stats['bytes_written'] += len(blob)
+
+        manifest_path = os.path.join(self.path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                stale.append(json.load(f)['state'])
+        manifest = {
+            'version': CHECKPOINT_VERSION,
+            'generation': self.generation,
+            'created': time.time(),
+            'arrays': self.files,
+            'digests': self.digests,
+            'state': state_file,
+        }
+        staging = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(staging, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(staging, manifest_path)
+
+        # Replaced files are no longer referenced by the manifest
+        for filename in stale:
+            if os.path.exists(os.path.join(self.path, filename)):
+                os.remove(os.path.join(self.path, filename))
+
+        self._last = time.perf_counter()
+        self.stats['checkpoints'] += 1
+        self.stats['write_seconds'] += self._last - started
+        return self.generation
+
+
+def read_manifest(path: str) -> Dict:
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No checkpoint in {path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest['version'] != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint version {manifest['version']} is not supported")
+    return manifest
+
+
+def read_checkpoint(path: str) -> Tuple[Dict[str, np.ndarray], object]:
+    """Arrays and state of the latest complete checkpoint in path"""
+    manifest = read_manifest(path)
+    arrays = {name: np.load(os.path.join(path, filename), allow_pickle=False)
+              for name, filename in manifest['arrays'].items()}
+    with open(os.path.join(path, manifest['state']), 'rb') as f:
+        state = pickle.load(f)
+    return arrays, state
+
+
+# Optimizer --------------------------------------------------------------
+
+def save_optimizer(optimizer, writer: CheckpointWriter, progress: Dict) -> int:
+    """Checkpoint an optimizer mid-run; progress says how far optimize_schedule got"""
+    from train_table import TrainTable
+    columnar = not isinstance(optimizer.trains, dict)
+    table = optimizer.trains if columnar else TrainTable.from_trains(optimizer.trains)
+    arrays = {f"trains.{name}": column for name, column in table.to_columns().items()}
+    # Conflicts rarely change between checkpoints, so they go through the digest check too
+    arrays['conflicts'] = np.frombuffer(pickle.dumps(optimizer.conflicts, protocol=pickle.HIGHEST_PROTOCOL),
+                                        dtype=np.uint8)
+    state = {
+        'progress': dict(progress),
+        'columnar': columnar,
+        'station_names': list(table.station_names),
+        'stations': {name: (station.current_occupancy, dict(station.platform_assignments))
+                     for name, station in optimizer.stations.items()},
+        'random_state': random.getstate(),
+        'decision_metrics': optimizer.decision_metrics,
+        'exact_solver_stats': optimizer.exact_solver_stats,
+        'spacing_stats': optimizer.spacing_stats,
+    }
+    return writer.write(arrays, state)
+
+
+def restore_optimizer(optimizer, path: str) -> Dict:
+    """Load an optimizer checkpoint into optimizer; returns the saved progress"""
+    from train_table import TrainTable
+    arrays, state = read_checkpoint(path)
+    columns = {name.split('.', 1)[1]: array for name, array in arrays.items() if name.startswith('trains.')}
+    table = TrainTable.from_columns(columns, state['station_names'])
+    optimizer.trains = table if state['columnar'] else table.to_trains()
+    for name, (occupancy, assignments) in state['stations'].items():
+        station = optimizer.stations[name]
+        station.current_occupancy = occupancy
+        station.platform_assignments = assignments
+    optimizer.conflicts = pickle.loads(arrays['conflicts'].tobytes())
+    optimizer.decision_metrics = state['decision_metrics']
+    optimizer.exact_solver_stats = state['exact_solver_stats']
+    optimizer.spacing_stats = state['spacing_stats']
+    random.setstate(state['random_state'])
+    optimizer.refresh_line_occupancy()
+    return state['progress']
+
+
+def checkpoint_info(path: str) -> Optional[Dict]:
+    """Generation, age and size of the checkpoint in path (None if there is none)"""
+    try:
+        manifest = read_manifest(path)
+    except FileNotFoundError:
+        return None
+    files = list(manifest['arrays'].values()) + [manifest['state']]
+    return {
+        'generation': manifest['generation'],
+        'age_seconds': time.time() - manifest['created'],
+        'bytes': sum(os.path.getsize(os.path.join(path, filename)) for filename in files),
+    }
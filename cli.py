@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Railway Throughput Command Line
+===============================
+
+One entry point for the batch workflows, run as `python -m cli <command>`:
+- generate: baseline simulation data (time-stepped or event-driven)
+- optimize: optimize a simulation file and save the output and its report
+- report: print a saved optimization report, or selected sections of it
+- diff: per-train/per-line before/after comparison (run_diff.py)
+- bench: time the load/optimize/report/write stages on an input
+
+Only argparse and json are imported up front. pandas, NumPy and the
+optimizer modules are imported by the command that needs them, so
+--help and report queries on saved reports start without them.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+
+
+def _format_for(path: str, requested: str = None) -> str:
+    if requested:
+        return requested
+    return 'parquet' if path.endswith(('.parquet', '.pq')) else 'csv'
+
+
+def report_path_for(output_path: str) -> str:
+    """Default report location next to an optimized output"""
+    stem = output_path
+    for suffix in ('.gz', '.bz2', '.zip', '.xz', '.csv', '.parquet', '.pq', '.changes'):
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+    return stem + '.report.json'
+
+
+def _json_default(value):
+    if hasattr(value, 'item'):  # NumPy scalars
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _require_engine(*formats):
+    """Fail before any work is done if Parquet is requested without an engine"""
+    if 'parquet' not in formats:
+        return
+    import importlib.util
+    if not any(importlib.util.find_spec(engine) for engine in ('pyarrow', 'fastparquet')):
+        raise SystemExit("Parquet needs pyarrow or fastparquet (pip install pyarrow)")
+
+
+def _check_output(path: str, file_format: str = None, compression: str = 'infer'):
+    if file_format == 'changes' or (file_format is None and path.endswith('.changes')):
+        from change_log import CHANGE_LOG_FORMAT, CHANGE_LOG_VERSION
+        from trajectory_archive import check_replaceable
+        try:
+            check_replaceable(path, CHANGE_LOG_FORMAT, CHANGE_LOG_VERSION)
+        except FileExistsError as e:
+            raise SystemExit(str(e))
+        return
+    from output_writer import resolve_output
+    try:
+        resolve_output(path, file_format, compression)
+    except (ValueError, ImportError) as e:
+        raise SystemExit(str(e))
+
+
+def _read_frame(path: str, file_format: str = None):
+    import pandas as pd
+    from encoding import CSV_DTYPES, encode_frame
+    if _format_for(path, file_format) == 'parquet':
+        return encode_frame(pd.read_parquet(path))
+    return pd.read_csv(path, dtype=CSV_DTYPES)
+
+
+def _write_frame(df, path: str, file_format: str = None):
+    if _format_for(path, file_format) == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def _load(optimizer, path: str, file_format: str = None, use_cache: bool = True):
+    """Load an input into the optimizer; CSVs go through the fleet cache"""
+    if _format_for(path, file_format) == 'parquet':
+        return optimizer.load_simulation_frame(_read_frame(path, 'parquet'))
+    return optimizer.load_simulation_data(path, use_cache=use_cache)
+
+
+def _check_sections(report: dict, sections):
+    missing = [name for name in sections or () if name not in report]
+    if missing:
+        raise SystemExit(f"Report has no section(s): {', '.join(missing)} "
+                         f"(available: {', '.join(report)})")
+
+
+def _print_report(report: dict, sections=None):
+    _check_sections(report, sections)
+    if sections:
+        for name in sections:
+            print(f"\n  {name.upper()}")
+            print(json.dumps(report[name], indent=2, default=_json_default))
+        return
+    for name, value in report.items():
+        if not isinstance(value, (dict, list)):
+            print(f"  {name}: {value:.2f}" if isinstance(value, float) else f"  {name}: {value}")
+    print(f"\n  Sections: {', '.join(name for name, value in report.items() if isinstance(value, (dict, list)))}")
+
+
+# Commands ---------------------------------------------------------------
+
+def cmd_generate(args):
+    _require_engine(_format_for(args.output, args.format))
+    import numpy as np
+    if args.seed is not None:
+        np.random.seed(args.seed)
+    if args.simulator == 'event':
+        if args.checkpoint:
+            raise SystemExit("Checkpoints are only supported by the realistic simulator")
+        from event_simulator import EventDrivenRailwaySimulator
+        df = EventDrivenRailwaySimulator().generate_event_schedule(num_trains=args.trains,
+                                                                   simulation_duration_hours=args.hours,
+                                                                   seed=args.seed)
+    else:
+        from csv_generator import RealisticRailwaySimulator
+        df = RealisticRailwaySimulator().generate_realistic_schedule(
+            num_trains=args.trains, simulation_duration_hours=args.hours, checkpoint_dir=args.checkpoint,
+            checkpoint_interval=args.checkpoint_interval, resume=args.resume)
+    _write_frame(df, args.output, args.format)
+    print(f" Saved {len(df)} records to {args.output}")
+
+
+def cmd_optimize(args):
+    _require_engine(_format_for(args.input, args.input_format))
+    _check_output(args.output, args.format, args.compression)
+    import random
+    from main import RailwayOptimizer
+    if args.seed is not None:
+        random.seed(args.seed)
+    optimizer = RailwayOptimizer(columnar=args.columnar)
+    optimizer.checkpoint_dir = args.checkpoint
+    optimizer.checkpoint_interval = args.checkpoint_interval
+    df_input = _load(optimizer, args.input, args.input_format, use_cache=not args.no_cache)
+    optimizer.optimize_schedule(solver=args.solver, cluster_time_limit=args.cluster_time_limit,
+                                deadline=args.deadline, resume=args.resume, materialize=False)
+    optimizer.write_output(args.output, args.format, args.compression)
+    report = optimizer.generate_optimization_report(trajectory_df=df_input)
+
+    report_path = args.report or report_path_for(args.output)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2, default=_json_default)
+    print(f" Optimized {report['total_trains']} trains: {args.output} (report: {report_path})")
+    print(f"  Efficiency score: {report['efficiency_score']:.2f}, conflicts: {report['conflicts_detected']}, "
+          f"average delay: {report['average_delay_minutes']:.2f} min")
+
+
+def cmd_report(args):
+    with open(args.report) as f:
+        report = json.load(f)
+    _check_sections(report, args.section)
+    if args.format == 'json':
+        selected = {name: report[name] for name in args.section} if args.section else report
+        print(json.dumps(selected, indent=2))
+    else:
+        _print_report(report, args.section)
+
+
+def cmd_diff(args):
+    from run_diff import diff_runs, print_diff, save_diff_tables
+    diff = diff_runs(args.before, args.after, args.headway, args.chunksize)
+    if args.format == 'json':
+        print(json.dumps(diff['summary'], indent=2, default=_json_default))
+    else:
+        print_diff(diff)
+    if args.output_dir:
+        save_diff_tables(diff, args.output_dir)
+        print(f"\n Saved comparison tables to {args.output_dir}")
+
+
+def cmd_bench(args):
+    _require_engine(_format_for(args.input))
+    _check_output(f'output.{args.format}', args.format, args.compression)
+    import random
+    import tempfile
+    started = time.perf_counter()
+    from main import RailwayOptimizer
+    timings = {'import': [time.perf_counter() - started]}
+
+    def timed(name, function):
+        started = time.perf_counter()
+        result = function()
+        timings.setdefault(name, []).append(time.perf_counter() - started)
+        return result
+
+    with tempfile.TemporaryDirectory() as scratch:
+        for run in range(args.repeat):
+            random.seed(args.seed)
+            optimizer = RailwayOptimizer(columnar=args.columnar)
+            if args.routing_batch_size is not None:
+                optimizer.routing_batch_size = args.routing_batch_size or None
+            df_input = timed('load', lambda: _load(optimizer, args.input, use_cache=args.cache))
+            timed('optimize', lambda: optimizer.optimize_schedule(materialize=False))
+            timed('report', lambda: optimizer.generate_optimization_report(trajectory_df=df_input))
+            output = os.path.join(scratch, f'output.{args.format}')
+            timed('write', lambda: optimizer.write_output(output, args.format, args.compression))
+
+    summary = {name: {'min': min(values), 'median': sorted(values)[len(values) // 2], 'runs': len(values)}
+               for name, values in timings.items()}
+    if args.json:
+        print(json.dumps({'input': args.input, 'trains': len(optimizer.trains), 'stages': summary}, indent=2))
+        return
+    print(f" {args.input}: {len(optimizer.trains)} trains, {args.repeat} run(s)")
+    for name, stats in summary.items():
+        print(f"  {name:<9} min {stats['min'] * 1000:9.1f} ms   median {stats['median'] * 1000:9.1f} ms")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m cli', description="Railway throughput optimization workflows")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log optimizer progress")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="generate baseline simulation data")
+    generate.add_argument('--output', default="train_simulation_output_before.csv")
+    generate.add_argument('--format', choices=OUTPUT_FORMATS, help="default: from the output extension")
+    generate.add_argument('--simulator', choices=('realistic', 'event'), default='realistic')
+    generate.add_argument('--trains', type=int, default=75)
+    generate.add_argument('--hours', type=int, default=12)
+    generate.add_argument('--seed', type=int, default=None)
+    generate.add_argument('--checkpoint', metavar='DIR', help="checkpoint directory for long runs")
+    generate.add_argument('--checkpoint-interval', type=float, default=300.0)
+    generate.add_argument('--resume', action='store_true', help="continue from the last checkpoint")
+    generate.set_defaults(handler=cmd_generate)
+
+    optimize = commands.add_parser('optimize', help="optimize a simulation file")
+    optimize.add_argument('input', help="simulation CSV or Parquet file")
+    optimize.add_argument('--output', default="train_simulation_output_after.csv")
+    optimize.add_argument('--input-format', choices=OUTPUT_FORMATS, help="default: from the input extension")
+    optimize.add_argument('--format', choices=OUTPUT_FORMATS + ('changes',),
+                          help="default: from the output extension (.changes for the change-log format)")
+    optimize.add_argument('--compression', default='infer',
+                          help="gzip, bz2 or xz for CSV; snappy, gzip or zstd for Parquet (default: from the extension)")
+    optimize.add_argument('--report', default=None, help="report JSON (default: <output>.report.json)")
+    optimize.add_argument('--solver', choices=('greedy', 'exact'), default='greedy')
+    optimize.add_argument('--cluster-time-limit', type=float, default=5.0, help="exact solver seconds per cluster")
+    optimize.add_argument('--deadline', type=float, default=None, help="anytime budget in seconds")
+    optimize.add_argument('--columnar', action='store_true', help="keep the fleet in a TrainTable")
+    optimize.add_argument('--seed', type=int, default=None)
+    optimize.add_argument('--no-cache', action='store_true', help="re-parse the input instead of using its fleet cache")
+    optimize.add_argument('--checkpoint', metavar='DIR', help="checkpoint directory for long runs")
+    optimize.add_argument('--checkpoint-interval', type=float, default=300.0)
+    optimize.add_argument('--resume', action='store_true', help="continue from the last checkpoint")
+    optimize.set_defaults(handler=cmd_optimize)
+
+    report = commands.add_parser('report', help="print a saved optimization report")
+    report.add_argument('report', nargs='?', default="train_simulation_output_after.report.json")
+    report.add_argument('--section', nargs='+', default=None, help="only these sections (e.g. decisions spacing)")
+    report.add_argument('--format', choices=('text', 'json'), default='text')
+    report.set_defaults(handler=cmd_report)
+
+    diff = commands.add_parser('diff', help="compare a simulation input with an optimized output")
+    diff.add_argument('before', nargs='?', default="train_simulation_output_before.csv")
+    diff.add_argument('after', nargs='?', default="train_simulation_output_after.csv")
+    diff.add_argument('--headway', type=float, default=500.0, help="headway minimum (m)")
+    diff.add_argument('--chunksize', type=int, default=1_000_000, help="rows read per chunk")
+    diff.add_argument('--output-dir', default=None, help="write the per-train/per-line tables here")
+    diff.add_argument('--format', choices=('text', 'json'), default='text')
+    diff.set_defaults(handler=cmd_diff)
+
+    bench = commands.add_parser('bench', help="time load/optimize/report/write on an input")
+    bench.add_argument('input', nargs='?', default="train_simulation_output_before.csv")
+    bench.add_argument('--repeat', type=int, default=3)
+    bench.add_argument('--columnar', action='store_true')
+    bench.add_argument('--routing-batch-size', type=int, default=None, help="0 routes one train at a time")
+    bench.add_argument('--cache', action='store_true', help="load through the fleet cache")
+    bench.add_argument('--format', choices=OUTPUT_FORMATS, default='csv', help="output format to time")
+    bench.add_argument('--compression', default=None, help="output compression to time")
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--json', action='store_true', help="print the timings as JSON")
+    bench.set_defaults(handler=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'resume', False) and not args.checkpoint:
+        raise SystemExit("--resume needs --checkpoint")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,23 +10,30 @@ Generates realistic baseline simulation data that represents:
 - Real-world train scheduling patterns
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from encoding import encode_frame
+from topology import load_topology
+
+# Record fields in generation order; string fields are checkpointed as codes
+RECORD_COLUMNS = ['timestamp', 'train_id', 'train_type', 'line', 'position_m',
+                  'speed_kmph', 'station', 'event', 'delay_minutes']
+STRING_COLUMNS = ('train_id', 'train_type', 'line', 'station', 'event')
 
 class RealisticRailwaySimulator:
-    def __init__(self):
+    def __init__(self, topology=None):
+        # Same corridor layout as the optimizer (topology.json by default)
+        self.topology = topology or load_topology()
         self.stations = {
-            "Mumbai Central": {"position": 0, "platforms": 6},
-            "Dadar": {"position": 15000, "platforms": 4}, 
-            "Bandra": {"position": 25000, "platforms": 3},
-            "Andheri": {"position": 35000, "platforms": 4},
-            "Borivali": {"position": 50000, "platforms": 3},
-            "Vasai": {"position": 70000, "platforms": 2},
-            "Hoshangabad": {"position": 92000, "platforms": 3}
+            station['name']: {"position": station['position'], "platforms": station['platforms']}
+            for station in self.topology.stations
         }
+        self.track_length = self.topology.track_length
         
         self.train_types = {
             "Express": {"speed": 120, "delay_prob": 0.15, "avg_delay": 8},
@@ -37,11 +44,21 @@ class RealisticRailwaySimulator:
             "Freight": {"speed": 60, "delay_prob": 0.35, "avg_delay": 15}
         }
         
-        self.lines = ["single_up", "single_down", "central", "loop"]
+        self.lines = [line.value for line in self.topology.lines]
         
     def generate_realistic_schedule(self, num_trains: int = 75, 
-                                  simulation_duration_hours: int = 12) -> pd.DataFrame:
-        """Generate realistic railway simulation data"""
+                                  simulation_duration_hours: int = 12,
+                                  checkpoint_dir: Optional[str] = None,
+                                  checkpoint_interval: float = 300.0,
+                                  resume: bool = False) -> pd.DataFrame:
+        """Generate realistic railway simulation data
+
+        With checkpoint_dir set, the train states, the next time interval,
+        the NumPy RNG state and the records generated since the previous
+        checkpoint are saved every checkpoint_interval seconds. resume=True
+        continues from the last checkpoint and returns the same frame as an
+        uninterrupted run.
+        """
         
         print(f"   Trains: {num_trains}")
         print(f"   Duration: {simulation_duration_hours} hours")
@@ -49,22 +66,6 @@ class RealisticRailwaySimulator:
         # Create base time
         base_time = datetime(2024, 1, 15, 6, 0, 0)
         
-        # Generate trains
-        trains = []
-        for i in range(num_trains):
-            train_type = np.random.choice(list(self.train_types.keys()), 
-                                        p=[0.2, 0.15, 0.3, 0.2, 0.1, 0.05])  # Realistic distribution
-            
-            train_id = f"{train_type[:2].upper()}-{i+1:03d}"
-            trains.append({
-                'train_id': train_id,
-                'train_type': train_type,
-                'config': self.train_types[train_type]
-            })
-        
-        # Generate simulation records
-        records = []
-        
         # Create time snapshots every 30 seconds for realistic progression
         time_intervals = []
         for hour in range(simulation_duration_hours):
@@ -74,30 +75,25 @@ class RealisticRailwaySimulator:
         
         print(f"   Time intervals: {len(time_intervals)}")
         
-        # Initialize train states
-        train_states = {}
-        for train in trains:
-            # Random starting position and line
-            initial_line = np.random.choice(self.lines)
-            initial_position = np.random.uniform(0, 92000)
-            
-            # Determine if train starts with delay
-            has_delay = np.random.random() < train['config']['delay_prob']
-            initial_delay = np.random.exponential(train['config']['avg_delay']) if has_delay else 0
-            
-            train_states[train['train_id']] = {
-                'train_type': train['train_type'],
-                'line': initial_line,
-                'position': initial_position,
-                'speed': train['config']['speed'] + np.random.uniform(-10, 10),
-                'delay_minutes': initial_delay,
-                'event': 'moving' if np.random.random() > 0.1 else 'scheduled',
-                'last_station': '',
-                'direction': 1 if 'up' in initial_line or 'central' in initial_line else -1
-            }
+        if resume:
+            if checkpoint_dir is None:
+                raise ValueError("resume needs checkpoint_dir")
+            writer, train_states, records, log, start = self._resume_checkpoint(
+                checkpoint_dir, checkpoint_interval, num_trains, simulation_duration_hours)
+            print(f"   Resuming at interval {start} ({len(records)} records)")
+        else:
+            train_states = self._initial_train_states(num_trains)
+            records = []
+            log = {'parts': 0, 'flushed': 0}  # record parts checkpointed so far
+            start = 0
+            writer = None
+            if checkpoint_dir is not None:
+                from checkpoint import CheckpointWriter
+                writer = CheckpointWriter(checkpoint_dir, checkpoint_interval)
         
         # Generate records for each time interval
-        for timestamp in time_intervals:
+        for index in range(start, len(time_intervals)):
+            timestamp = time_intervals[index]
             self._update_train_states(train_states, timestamp)
             
             for train_id, state in train_states.items():
@@ -117,15 +113,111 @@ class RealisticRailwaySimulator:
                 }
                 
                 records.append(record)
+            
+            if writer is not None and writer.due():
+                self._save_checkpoint(writer, train_states, records, log, index + 1,
+                                      (num_trains, simulation_duration_hours))
         
         df = pd.DataFrame(records)
         
         # Add some realistic operational issues
         df = self._add_realistic_issues(df)
         
+        # Dictionary-encode the string columns
+        df = encode_frame(df)
+        
         print(f" Generated {len(df)} realistic simulation records")
         return df
     
+    def _initial_train_states(self, num_trains: int) -> Dict[str, Dict]:
+        """Draw the fleet and each train's starting state"""
+        # Generate trains
+        trains = []
+        for i in range(num_trains):
+            train_type = np.random.choice(list(self.train_types.keys()), 
+                                        p=[0.2, 0.15, 0.3, 0.2, 0.1, 0.05])  # Realistic distribution
+            
+            train_id = f"{train_type[:2].upper()}-{i+1:03d}"
+            trains.append({
+                'train_id': train_id,
+                'train_type': train_type,
+                'config': self.train_types[train_type]
+            })
+        
+        # Initialize train states
+        train_states = {}
+        for train in trains:
+            # Random starting position and line
+            initial_line = np.random.choice(self.lines)
+            initial_position = np.random.uniform(0, self.track_length)
+            
+            # Determine if train starts with delay
+            has_delay = np.random.random() < train['config']['delay_prob']
+            initial_delay = np.random.exponential(train['config']['avg_delay']) if has_delay else 0.0
+            
+            train_states[train['train_id']] = {
+                'train_type': train['train_type'],
+                'line': initial_line,
+                'position': initial_position,
+                'speed': train['config']['speed'] + np.random.uniform(-10, 10),
+                'delay_minutes': initial_delay,
+                'event': 'moving' if np.random.random() > 0.1 else 'scheduled',
+                'last_station': '',
+                'direction': 1 if 'up' in initial_line or 'central' in initial_line else -1
+            }
+        
+        return train_states
+    
+    def _save_checkpoint(self, writer, train_states: Dict, records: List[Dict], log: Dict,
+                         next_interval: int, run: Tuple[int, int]):
+        """Checkpoint the generator; only records added since the last checkpoint are written"""
+        new_records = records[log['flushed']:]
+        arrays = {}
+        if new_records:
+            part = f"records.{log['parts']}"
+            for name in RECORD_COLUMNS:
+                values = [record[name] for record in new_records]
+                if name in STRING_COLUMNS:
+                    categories, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+                    arrays[f"{part}.{name}.categories"] = categories
+                    arrays[f"{part}.{name}"] = codes.astype(np.int32)
+                elif name == 'timestamp':
+                    arrays[f"{part}.{name}"] = np.array(values, dtype='datetime64[us]').view(np.int64)
+                else:
+                    arrays[f"{part}.{name}"] = np.array(values, dtype=np.float64)
+            log['parts'] += 1
+            log['flushed'] = len(records)
+        writer.write(arrays, {
+            'run': run,
+            'next_interval': next_interval,
+            'records': dict(log),
+            'train_states': train_states,
+            'numpy_random_state': np.random.get_state(),
+        })
+    
+    def _resume_checkpoint(self, path: str, interval: float, num_trains: int,
+                           simulation_duration_hours: int) -> Tuple[object, Dict, List[Dict], Dict, int]:
+        """Writer, train states, records so far, record log and next interval of the checkpoint in path"""
+        from checkpoint import CheckpointWriter, read_checkpoint
+        arrays, state = read_checkpoint(path)
+        if tuple(state['run']) != (num_trains, simulation_duration_hours):
+            raise ValueError(f"Checkpoint in {path} is for {state['run'][0]} trains over "
+                             f"{state['run'][1]} hours")
+        records = []
+        for part in range(state['records']['parts']):
+            columns = []
+            for name in RECORD_COLUMNS:
+                values = arrays[f"records.{part}.{name}"]
+                if name in STRING_COLUMNS:
+                    values = arrays[f"records.{part}.{name}.categories"][values]
+                elif name == 'timestamp':
+                    values = values.view('datetime64[us]').astype(object)
+                columns.append(values.tolist())
+            records.extend(dict(zip(RECORD_COLUMNS, values)) for values in zip(*columns))
+        np.random.set_state(state['numpy_random_state'])
+        writer = CheckpointWriter.resume(path, interval)
+        return writer, state['train_states'], records, dict(state['records']), state['next_interval']
+    
     def _update_train_states(self, train_states: Dict, timestamp: datetime):
         """Update train positions and states for given timestamp"""
         
@@ -139,10 +231,10 @@ class RealisticRailwaySimulator:
                 state['position'] += distance_increment
                 
                 # Keep within track bounds
-                state['position'] = max(0, min(92000, state['position']))
+                state['position'] = max(0, min(self.track_length, state['position']))
                 
                 # Reverse direction at ends
-                if state['position'] <= 0 or state['position'] >= 92000:
+                if state['position'] <= 0 or state['position'] >= self.track_length:
                     state['direction'] *= -1
                     if state['line'] == 'single_up':
                         state['line'] = 'single_down'
@@ -278,17 +370,30 @@ class RealisticRailwaySimulator:
                         df.loc[excess_indices, 'event'] = 'delayed'
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate realistic baseline simulation data")
+    parser.add_argument('--trains', type=int, default=75, help="number of trains")
+    parser.add_argument('--hours', type=int, default=12, help="simulated hours")
+    parser.add_argument('--output', default="train_simulation_output_before.csv", help="output CSV")
+    parser.add_argument('--checkpoint', metavar='DIR', help="checkpoint directory for long runs")
+    parser.add_argument('--checkpoint-interval', type=float, default=300.0, help="seconds between checkpoints")
+    parser.add_argument('--resume', action='store_true', help="continue from the last checkpoint in --checkpoint")
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
     
     simulator = RealisticRailwaySimulator()
     
     # Generate realistic baseline data
     df_realistic = simulator.generate_realistic_schedule(
-        num_trains=75,
-        simulation_duration_hours=12
+        num_trains=args.trains,
+        simulation_duration_hours=args.hours,
+        checkpoint_dir=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume
     )
     
     # Save as new baseline
-    output_file = "train_simulation_output_before.csv"
+    output_file = args.output
     df_realistic.to_csv(output_file, index=False)
     
     print(f"\n Saved realistic simulation data to {output_file}")
@@ -301,6 +406,7 @@ def main():
     
     # Event distribution
     event_dist = df_realistic['event'].value_counts()
+    event_dist = event_dist[event_dist > 0]
     print(f"\n EVENT DISTRIBUTION:")
     for event, count in event_dist.items():
         percentage = (count / len(df_realistic)) * 100
@@ -308,6 +414,7 @@ def main():
     
     # Train type distribution  
     train_dist = df_realistic['train_type'].value_counts()
+    train_dist = train_dist[train_dist > 0]
     print(f"\n TRAIN TYPE DISTRIBUTION:")
     for train_type, count in train_dist.items():
         percentage = (count / len(df_realistic)) * 100
@@ -324,6 +431,7 @@ def main():
     
     # Line usage
     line_dist = df_realistic['line'].value_counts()
+    line_dist = line_dist[line_dist > 0]
     print(f"\n  LINE USAGE:")
     for line, count in line_dist.items():
         percentage = (count / len(df_realistic)) * 100
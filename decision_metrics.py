@@ -0,0 +1,135 @@
+"""
+Optimizer Decision Metrics
+==========================
+
+Low-overhead accounting of what the optimizer decided, replacing per-event
+log lines in the per-train loops:
+- Counters per decision kind (reroutes, evictions, reactivations, halts,
+  delays, spacing moves, route proposals)
+- Applied reroutes by from->to line and by the rule that made them
+- Fixed-bin histograms (spacing adjustment, reroute score gain,
+  disruption severity)
+- An optional structured decision log keeping every sample_every-th
+  decision, written as JSON lines
+
+Per-event log lines are only formatted when the optimizer's logger is
+enabled for DEBUG. summary() is what generate_optimization_report adds
+under 'decisions'.
+"""
+
+import json
+import logging
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger('main')
+
+HISTOGRAM_EDGES = {
+    'spacing_adjustment_m': [0, 600, 1200, 2400, 4800, 9600],
+    'reroute_score_gain': [0, 10, 20, 40, 80],
+    'disruption_severity': [0.8, 0.9, 1.0, 1.1, 1.2, 1.3],
+}
+
+
+class Histogram:
+    """Counts per [edge_i, edge_i+1) bin; the last bin is open-ended"""
+
+    def __init__(self, edges: Sequence[float]):
+        self.edges = list(edges)
+        self.counts = [0] * len(self.edges)
+        self.below = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def add(self, value: float):
+        index = bisect_right(self.edges, value) - 1
+        if index < 0:
+            self.below += 1
+        else:
+            self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Histogram'):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.below += other.below
+        self.count += other.count
+        self.total += other.total
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def summary(self) -> Dict:
+        labels = [f"{low:g}-{high:g}" for low, high in zip(self.edges, self.edges[1:])] + [f">={self.edges[-1]:g}"]
+        bins = dict(zip(labels, self.counts))
+        if self.below:
+            bins[f"<{self.edges[0]:g}"] = self.below
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max if self.max is not None else 0.0,
+            'bins': bins,
+        }
+
+
+class DecisionMetrics:
+    """Counters, histograms and a sampled log of optimizer decisions"""
+
+    def __init__(self, sample_every: int = 0, max_log_records: int = 10000):
+        self.sample_every = sample_every
+        self.max_log_records = max_log_records
+        self.counts = Counter()
+        self.reroutes = Counter()
+        self.reroute_reasons = Counter()
+        self.histograms = {name: Histogram(edges) for name, edges in HISTOGRAM_EDGES.items()}
+        self.log: List[Dict] = []
+        self.decisions = 0
+        self.verbose = logger.isEnabledFor(logging.DEBUG)
+
+    def record(self, kind: str, train_id: str, **fields):
+        """Count one decision and keep it in the log if it is sampled"""
+        self.counts[kind] += 1
+        self.decisions += 1
+        if self.sample_every and self.decisions % self.sample_every == 0 and len(self.log) < self.max_log_records:
+            self.log.append({'seq': self.decisions, 'kind': kind, 'train_id': train_id, **fields})
+        if self.verbose:
+            logger.debug("%s %s %s", kind, train_id, fields)
+
+    def observe(self, name: str, value: float):
+        self.histograms[name].add(value)
+
+    def reroute(self, train_id: str, from_line, to_line, reason: str):
+        """An applied line change"""
+        self.reroutes[(from_line.value, to_line.value)] += 1
+        self.reroute_reasons[reason] += 1
+        self.record('reroute', train_id, from_line=from_line.value, to_line=to_line.value, reason=reason)
+
+    def merge(self, other: 'DecisionMetrics'):
+        """Add another optimizer's metrics (e.g. one section of a partitioned run)"""
+        self.counts.update(other.counts)
+        self.reroutes.update(other.reroutes)
+        self.reroute_reasons.update(other.reroute_reasons)
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        room = max(self.max_log_records - len(self.log), 0)
+        self.log.extend(other.log[:room])
+        self.decisions += other.decisions
+
+    def summary(self) -> Dict:
+        return {
+            'total_decisions': self.decisions,
+            'by_kind': dict(self.counts),
+            'reroutes_by_line': {f"{a}->{b}": n for (a, b), n in sorted(self.reroutes.items())},
+            'reroutes_by_reason': dict(self.reroute_reasons),
+            'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+            'logged_decisions': len(self.log),
+        }
+
+    def write_log(self, path: str):
+        """Write the sampled decisions as JSON lines"""
+        with open(path, 'w') as f:
+            for entry in self.log:
+                f.write(json.dumps(entry) + '\n')
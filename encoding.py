@@ -0,0 +1,116 @@
+"""
+Shared Categorical Encoding
+===========================
+
+Fixed small-int codes for the train type, line and event enums, plus the
+pandas categorical dtypes built from them, so the generator, the optimizer
+loader/output, the columnar TrainTable and the dashboard all agree on one
+dictionary encoding:
+- train_type, line, event: fixed categories in enum declaration order
+- train_id, station: data-driven categories
+- CONFIG_TABLE: per-type TrainConfig fields as arrays indexed by type code
+- COLUMN_LAYOUT: fixed-width column layout of an encoded frame, used by the
+  shared-memory scenario frames and the trajectory archive
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+from main import TrainConfig, TrainType, LineType, EventType
+
+TRAIN_TYPES = list(TrainType)
+LINES = list(LineType)
+EVENTS = list(EventType)
+
+TRAIN_TYPE_CODES = {train_type: code for code, train_type in enumerate(TRAIN_TYPES)}
+LINE_CODES = {line: code for code, line in enumerate(LINES)}
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+
+TRAIN_TYPE_DTYPE = pd.CategoricalDtype([train_type.value for train_type in TRAIN_TYPES])
+LINE_DTYPE = pd.CategoricalDtype([line.value for line in LINES])
+EVENT_DTYPE = pd.CategoricalDtype([event.value for event in EVENTS])
+
+# dtype mapping for pd.read_csv on simulation files
+CSV_DTYPES = {
+    'train_id': 'category',
+    'train_type': TRAIN_TYPE_DTYPE,
+    'line': LINE_DTYPE,
+    'station': 'category',
+    'event': EVENT_DTYPE,
+}
+
+# One shared config per train type, indexed by type code
+CONFIGS = [TrainConfig.get_config(train_type.value) for train_type in TRAIN_TYPES]
+CONFIG_TABLE = {
+    'base_speed': np.array([config.base_speed for config in CONFIGS], dtype=np.float64),
+    'dwell_time': np.array([config.dwell_time for config in CONFIGS], dtype=np.float64),
+    'disruption_probability': np.array([config.disruption_probability for config in CONFIGS], dtype=np.float64),
+    'priority': np.array([config.priority for config in CONFIGS], dtype=np.int8),
+}
+
+
+def encode_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the string columns of a simulation frame to categoricals in place"""
+    for column, dtype in CSV_DTYPES.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def concat_encoded(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate encoded frames, merging the data-driven categories"""
+    df = pd.concat(frames, ignore_index=True)
+    for column in ('train_id', 'station'):
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+# (column, dtype) of a frame stored as fixed-width code/value arrays
+COLUMN_LAYOUT = [
+    ('timestamp', np.int64),
+    ('position_m', np.float64),
+    ('speed_kmph', np.float64),
+    ('delay_minutes', np.float64),
+    ('train_id', np.int32),
+    ('station', np.int32),
+    ('train_type', np.int8),
+    ('line', np.int8),
+    ('event', np.int8),
+]
+
+_FIXED_DTYPES = {'train_type': TRAIN_TYPE_DTYPE, 'line': LINE_DTYPE, 'event': EVENT_DTYPE}
+
+
+def frame_to_columns(df: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], Dict[str, List[str]]]:
+    """Split a simulation frame into COLUMN_LAYOUT arrays plus the data-driven categories"""
+    columns = {
+        'timestamp': pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]').astype(np.int64),
+        'position_m': df['position_m'].to_numpy(dtype=np.float64),
+        'speed_kmph': df['speed_kmph'].to_numpy(dtype=np.float64),
+        'delay_minutes': df['delay_minutes'].to_numpy(dtype=np.float64),
+    }
+    categories = {}
+    for name in ('train_id', 'station'):
+        values = df[name].astype('category')  # missing stations become code -1
+        columns[name] = values.cat.codes.to_numpy(dtype=np.int32)
+        categories[name] = [str(category) for category in values.cat.categories]
+    for name, dtype in _FIXED_DTYPES.items():
+        columns[name] = df[name].astype(dtype).cat.codes.to_numpy(dtype=np.int8)
+    return columns, categories
+
+
+def columns_to_frame(columns: Dict[str, np.ndarray], categories: Dict[str, List[str]]) -> pd.DataFrame:
+    """Rebuild an encoded frame from COLUMN_LAYOUT arrays without copying the numeric columns"""
+    return pd.DataFrame({
+        'timestamp': columns['timestamp'].view('datetime64[ns]'),
+        'train_id': pd.Categorical.from_codes(columns['train_id'], categories=categories['train_id']),
+        'train_type': pd.Categorical.from_codes(columns['train_type'], dtype=TRAIN_TYPE_DTYPE),
+        'line': pd.Categorical.from_codes(columns['line'], dtype=LINE_DTYPE),
+        'position_m': columns['position_m'],
+        'speed_kmph': columns['speed_kmph'],
+        'station': pd.Categorical.from_codes(columns['station'], categories=categories['station']),
+        'event': pd.Categorical.from_codes(columns['event'], dtype=EVENT_DTYPE),
+        'delay_minutes': columns['delay_minutes'],
+    }, copy=False)
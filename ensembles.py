@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo Disruption Ensembles
+================================
+
+Vectorized version of RailwayOptimizer.simulate_disruptions that evaluates
+K disruption realizations at once:
+- Disruption risk is computed for all trains as one array
+- Disruption draws, severities and extra delays are K x N matrices and the
+  speed/delay/event effects are applied by broadcasting
+- The 5% disruption cap is applied per realization in train order, as the
+  serial loop does
+- The report's headline KPIs are computed per realization and summarized
+  as mean, spread and a confidence interval
+
+The ensemble covers the disruption stage only; the routing and spacing
+stages of optimize_schedule are not re-run per realization.
+"""
+
+import argparse
+from typing import Dict, Optional
+
+import numpy as np
+
+from main import RailwayOptimizer, EventType
+from encoding import CONFIG_TABLE, TRAIN_TYPE_CODES, LINE_CODES, EVENT_CODES
+
+HEADLINE_KPIS = ['efficiency_score', 'average_delay_minutes', 'delayed_percentage',
+                 'on_time_percentage', 'halted_percentage', 'average_speed_kmph']
+
+
+def _fleet_columns(optimizer: RailwayOptimizer) -> Dict[str, np.ndarray]:
+    trains = list(optimizer.trains.values())
+    return {
+        'train_type': np.array([TRAIN_TYPE_CODES[t.train_type] for t in trains], dtype=np.int8),
+        'line': np.array([LINE_CODES[t.current_line] for t in trains], dtype=np.int8),
+        'event': np.array([EVENT_CODES[t.event] for t in trains], dtype=np.int8),
+        'position': np.array([t.current_position for t in trains], dtype=np.float64),
+        'speed': np.array([t.current_speed for t in trains], dtype=np.float64),
+        'delay': np.array([t.delay_minutes for t in trains], dtype=np.float64),
+    }
+
+
+def disruption_risks(optimizer: RailwayOptimizer, columns: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """calculate_disruption_risk for every train at once"""
+    columns = columns or _fleet_columns(optimizer)
+    base_risk = CONFIG_TABLE['disruption_probability'][columns['train_type']]
+    delay_factor = 1 + columns['delay'] / 60
+
+    moving = columns['event'] == EVENT_CODES[EventType.MOVING]
+    moving_per_line = np.bincount(columns['line'][moving], minlength=len(LINE_CODES))
+    congestion_factor = np.where(moving_per_line[columns['line']] > 5, 1.5, 1.0)
+
+    # get_station_by_position returns the first station within 2 km
+    station_factor = np.ones(len(columns['position']))
+    matched = np.zeros(len(columns['position']), dtype=bool)
+    for station in optimizer.stations.values():
+        near = ~matched & (np.abs(columns['position'] - station.position) < 2000)
+        if station.current_occupancy >= station.platforms * 0.8:
+            station_factor[near] = 1.3
+        matched |= near
+
+    return np.minimum(base_risk * delay_factor * congestion_factor * station_factor, 1.0)
+
+
+def run_disruption_ensemble(optimizer: RailwayOptimizer, n_realizations: int = 1000,
+                            confidence: float = 0.95, seed: Optional[int] = None,
+                            block_elements: int = 4_000_000) -> Dict:
+    """Evaluate n_realizations disruption draws and summarize the headline KPIs"""
+    columns = _fleet_columns(optimizer)
+    n_trains = len(columns['position'])
+    if n_trains == 0:
+        raise ValueError("No trains loaded")
+
+    rng = np.random.default_rng(seed)
+    risk = disruption_risks(optimizer, columns) * 0.5  # simulate_disruptions halves the risk
+    max_disruptions = max(3, int(n_trains * optimizer.max_disruption_ratio))
+    halted_code = EVENT_CODES[EventType.HALTED]
+    base_halted = columns['event'] == halted_code
+
+    samples = {kpi: np.empty(n_realizations) for kpi in HEADLINE_KPIS}
+    block = max(1, block_elements // n_trains)  # realizations per block, bounds memory
+    for start in range(0, n_realizations, block):
+        k = min(block, n_realizations - start)
+
+        disrupted = rng.random((k, n_trains)) < risk
+        disrupted &= np.cumsum(disrupted, axis=1) <= max_disruptions
+        severity = rng.uniform(0.8, 1.3, (k, n_trains))
+        minor = disrupted & (severity < 1.0)
+        halted = disrupted & ~minor
+
+        delay = columns['delay'] + np.where(minor, rng.uniform(1, 3, (k, n_trains)), 0.0)
+        speed = np.where(minor, np.maximum(columns['speed'] * 0.8, 20), columns['speed'])
+        speed = np.where(halted, 0.0, speed)
+        halted |= base_halted & ~minor
+
+        on_time = (delay <= 5).sum(axis=1)
+        average_delay = delay.mean(axis=1)
+        moving_speeds = speed > 0
+        slice_ = slice(start, start + k)
+        samples['average_delay_minutes'][slice_] = average_delay
+        samples['delayed_percentage'][slice_] = (delay > 5).mean(axis=1) * 100
+        samples['on_time_percentage'][slice_] = on_time / n_trains * 100
+        samples['halted_percentage'][slice_] = halted.mean(axis=1) * 100
+        samples['average_speed_kmph'][slice_] = (np.where(moving_speeds, speed, 0).sum(axis=1)
+                                                 / np.maximum(moving_speeds.sum(axis=1), 1))
+        samples['efficiency_score'][slice_] = np.clip(
+            100 - average_delay * 2 - (n_trains - on_time) / n_trains * 30, 0, 100)
+
+    tail = (1 - confidence) / 2 * 100
+    summary = {}
+    for kpi, values in samples.items():
+        summary[kpi] = {
+            'mean': float(values.mean()),
+            'std': float(values.std(ddof=1)) if n_realizations > 1 else 0.0,
+            'median': float(np.median(values)),
+            'ci_low': float(np.percentile(values, tail)),
+            'ci_high': float(np.percentile(values, 100 - tail)),
+        }
+
+    return {
+        'n_realizations': n_realizations,
+        'confidence': confidence,
+        'kpis': summary,
+        'samples': samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disruption ensemble KPI confidence intervals")
+    parser.add_argument('input', help="simulation CSV")
+    parser.add_argument('-k', '--realizations', type=int, default=1000)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    optimizer = RailwayOptimizer()
+    optimizer.load_simulation_data(args.input)
+    ensemble = run_disruption_ensemble(optimizer, args.realizations, args.confidence, args.seed)
+
+    print(f"\n DISRUPTION ENSEMBLE ({ensemble['n_realizations']} realizations, "
+          f"{ensemble['confidence'] * 100:.0f}% CI)")
+    for kpi, stats in ensemble['kpis'].items():
+        print(f"  {kpi}: {stats['mean']:.2f} [{stats['ci_low']:.2f}, {stats['ci_high']:.2f}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Warm-Start Fleet Cache
+======================
+
+Sidecar cache of what load_simulation_data builds from a simulation CSV:
+- The parsed, typed frame (categorical codes, datetimes and numbers as
+  .npy arrays) and the fleet as TrainTable columns
+- Station platform assignments and the source offset/columns that
+  ingest_appended_data continues from
+- Stored next to the CSV in <name>.fleet/ with the checkpoint.py layout
+  (arrays, pickled state, atomically swapped manifest)
+
+An entry is keyed by the CSV's size, mtime and BLAKE2b content hash. When
+size and mtime match it is loaded without touching the CSV. When only the
+mtime changed (the file was copied or touched) the content hash decides,
+and a matching entry is re-stamped with the new mtime. Anything else
+re-parses the CSV and replaces the entry.
+"""
+
+import hashlib
+import os
+import pickle
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from checkpoint import CheckpointWriter, read_manifest
+
+CACHE_SUFFIX = '.fleet'
+CACHE_VERSION = 1
+
+
+def cache_path_for(csv_path: str) -> str:
+    """Default cache directory next to a simulation CSV"""
+    return os.path.splitext(csv_path)[0] + CACHE_SUFFIX
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str) -> Dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'blake2b': file_digest(path)}
+
+
+def unchanged_since(path: str, source: Dict) -> bool:
+    """Whether path still has the size and mtime recorded in a fingerprint (no re-hash)"""
+    stat = os.stat(path)
+    return stat.st_size == source['size'] and stat.st_mtime_ns == source['mtime_ns']
+
+
+def _frame_arrays(df: pd.DataFrame):
+    """Per-column arrays plus what is needed to rebuild each column's dtype"""
+    arrays, columns = {}, []
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[f"frame.{name}"] = series.cat.codes.to_numpy()
+            columns.append((name, 'category', list(series.cat.categories)))
+        elif pd.api.types.is_datetime64_dtype(series.dtype):
+            values = series.to_numpy()
+            arrays[f"frame.{name}"] = values.view(np.int64)
+            columns.append((name, 'datetime', str(values.dtype)))
+        elif series.dtype.kind in 'biuf':
+            arrays[f"frame.{name}"] = series.to_numpy()
+            columns.append((name, 'values', None))
+        else:
+            values = series.astype('category')
+            arrays[f"frame.{name}"] = values.cat.codes.to_numpy()
+            columns.append((name, 'strings', (list(values.cat.categories), str(series.dtype))))
+    return arrays, columns
+
+
+def _rebuild_frame(arrays: Dict[str, np.ndarray], columns) -> pd.DataFrame:
+    data = {}
+    for name, kind, detail in columns:
+        values = arrays[f"frame.{name}"]
+        if kind == 'category':
+            data[name] = pd.Categorical.from_codes(values, categories=detail)
+        elif kind == 'datetime':
+            data[name] = values.view(detail)
+        elif kind == 'strings':
+            categories, dtype = detail
+            data[name] = pd.Categorical.from_codes(values, categories=categories).astype(dtype)
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _station_layout(optimizer):
+    return sorted((name, station.position, station.platforms) for name, station in optimizer.stations.items())
+
+
+def _read_state(path: str) -> Optional[Dict]:
+    try:
+        manifest = read_manifest(path)
+        with open(os.path.join(path, manifest['state']), 'rb') as f:
+            state = pickle.load(f)
+    except (FileNotFoundError, ValueError, pickle.UnpicklingError, EOFError):
+        return None
+    return state if state.get('version') == CACHE_VERSION else None
+
+
+def save_fleet_cache(optimizer, csv_path: str, df: pd.DataFrame, source: Dict,
+                     cache_path: Optional[str] = None):
+    """Store a freshly loaded optimizer's frame and fleet for csv_path"""
+    from train_table import TrainTable
+    cache_path = cache_path or cache_path_for(csv_path)
+    table = optimizer.trains if not isinstance(optimizer.trains, dict) else TrainTable.from_trains(optimizer.trains)
+    arrays, columns = _frame_arrays(df)
+    arrays.update({f"trains.{name}": column for name, column in table.to_columns().items()})
+    state = {
+        'version': CACHE_VERSION,
+        'fingerprint': source,
+        'columns': columns,
+        'station_layout': _station_layout(optimizer),
+        'station_names': list(table.station_names),
+        'stations': {name: (station.current_occupancy, dict(station.platform_assignments))
+                     for name, station in optimizer.stations.items()},
+        'source_offset': optimizer.source_offset,
+        'source_columns': optimizer.source_columns,
+    }
+    exists = _read_state(cache_path) is not None
+    writer = CheckpointWriter.resume(cache_path) if exists else CheckpointWriter(cache_path)
+    writer.write(arrays, state)
+
+
+def load_fleet_cache(optimizer, csv_path: str, cache_path: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Restore the frame and fleet for csv_path if the cache entry is current, else None"""
+    from checkpoint import read_checkpoint
+    from train_table import TrainTable
+    cache_path = cache_path or cache_path_for(csv_path)
+    state = _read_state(cache_path)
+    if state is None or state['station_layout'] != _station_layout(optimizer):
+        return None
+    cached = state['fingerprint']
+    stat = os.stat(csv_path)
+    if stat.st_size != cached['size']:
+        return None
+    if stat.st_mtime_ns != cached['mtime_ns']:
+        if file_digest(csv_path) != cached['blake2b']:
+            return None
+        # Same content under a new mtime: re-stamp the entry
+        state['fingerprint'] = dict(cached, mtime_ns=stat.st_mtime_ns)
+        try:
+            CheckpointWriter.resume(cache_path).write({}, state)
+        except OSError:
+            pass  # read-only cache: still valid, the content is re-hashed on the next load
+
+    arrays, _ = read_checkpoint(cache_path)
+    columns = {name.split('.', 1)[1]: array for name, array in arrays.items() if name.startswith('trains.')}
+    table = TrainTable.from_columns(columns, state['station_names'])
+    optimizer.trains = table if not isinstance(optimizer.trains, dict) else table.to_trains()
+    for name, station in optimizer.stations.items():
+        occupancy, assignments = state['stations'][name]
+        station.current_occupancy = occupancy
+        station.platform_assignments = assignments
+    optimizer.source_path = csv_path
+    optimizer.source_offset = state['source_offset']
+    optimizer.source_columns = state['source_columns']
+    optimizer.refresh_line_occupancy()
+    return _rebuild_frame(arrays, state['columns'])
@@ -1,16 +1,17 @@
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Dict, Iterator, List, Optional, Tuple, Set
 from enum import Enum
 import logging
-from collections import defaultdict
+from collections import defaultdict, Counter
 import copy
+import io
+import time
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class TrainType(Enum):
@@ -79,21 +80,19 @@ class TrainConfig:
     
     @classmethod
     def get_config(cls, train_type_str: str) -> 'TrainConfig':
-        configs = {
-            TrainType.EXPRESS: cls(TrainType.EXPRESS, 120, 2.0, 0.05, 1),
-            TrainType.SUPERFAST: cls(TrainType.SUPERFAST, 140, 1.5, 0.03, 1),
-            TrainType.PASSENGER: cls(TrainType.PASSENGER, 80, 3.0, 0.15, 4),
-            TrainType.MEMU: cls(TrainType.MEMU, 90, 2.5, 0.12, 3),
-            TrainType.MAIL: cls(TrainType.MAIL, 110, 2.0, 0.08, 2),
-            TrainType.FREIGHT: cls(TrainType.FREIGHT, 60, 5.0, 0.25, 5)
-        }
-        
-        # Convert string to enum
-        for train_type in TrainType:
-            if train_type.value == train_type_str:
-                return configs.get(train_type, configs[TrainType.PASSENGER])
-        
-        return configs[TrainType.PASSENGER]
+        # Shared, precomputed configs; unknown types fall back to Passenger
+        return _TRAIN_CONFIGS.get(train_type_str, _TRAIN_CONFIGS[TrainType.PASSENGER.value])
+
+_TRAIN_CONFIGS = {
+    config.train_type.value: config for config in [
+        TrainConfig(TrainType.EXPRESS, 120, 2.0, 0.05, 1),
+        TrainConfig(TrainType.SUPERFAST, 140, 1.5, 0.03, 1),
+        TrainConfig(TrainType.PASSENGER, 80, 3.0, 0.15, 4),
+        TrainConfig(TrainType.MEMU, 90, 2.5, 0.12, 3),
+        TrainConfig(TrainType.MAIL, 110, 2.0, 0.08, 2),
+        TrainConfig(TrainType.FREIGHT, 60, 5.0, 0.25, 5)
+    ]
+}
 
 @dataclass
 class Train:
@@ -121,27 +120,65 @@ class Train:
         if not self.route_history:
             self.route_history = [self.current_line]
 
+# Events that count towards a line's congestion in _evaluate_line_score
+LINE_SCORE_EVENTS = (EventType.MOVING, EventType.HALTED)
+
+# Routing batches between optimize_schedule checkpoint opportunities
+ROUTING_CHECKPOINT_BATCHES = 16
+
+# Rows per chunk when the optimized output is streamed (iter_output_chunks)
+OUTPUT_CHUNK_ROWS = 500_000
+
 class RailwayOptimizer:
-    def __init__(self):
+    def __init__(self, columnar: bool = False, topology=None):
+        # Corridor layout from topology.json unless a Topology is given
+        if topology is None:
+            from topology import load_topology
+            topology = load_topology()
+        self.topology = topology
         self.stations = self._initialize_stations()
-        self.trains = {}
+        if columnar:
+            # Struct-of-arrays fleet state with Train-compatible row views
+            from train_table import TrainTable
+            self.trains = TrainTable()
+        else:
+            self.trains = {}
         self.conflicts = []
         self.optimization_history = []
         self.headway_minimum = 500.0  # meters
-        self.track_length = 92000  # meters (based on position data)
+        self.track_length = topology.track_length  # meters
+        self.max_disruption_ratio = 0.05  # share of trains simulate_disruptions may disrupt
+        self.active_train_ratio = 0.5  # share of trains ensure_active_trains keeps moving
+        self.spacing_step = 600.0  # meters between re-spaced trains (at least headway_minimum); per trailing train in legacy
+        self.spacing_resolver = "fixpoint"  # "fixpoint" (spacing.py) or "legacy" (fixed shifts and reroutes)
+        self.spacing_max_iterations = 10  # forward/backward passes per fixpoint resolution
+        self.checkpoint_dir = None  # optimize_schedule checkpoints here when set (checkpoint.py)
+        self.checkpoint_interval = 300.0  # seconds between checkpoints
+        self.checkpoint_stats = None
+        self._checkpoint = None
+        self.output_stats = None
+        self.routing_batch_size = 256  # trains scored per routing pass; None routes one train at a time
+        self.exact_solver_stats = None
+        self.anytime_stats = None
+        self.spacing_stats = None
+        self.partition_stats = None
+        self.source_path = None
+        self.source_offset = 0
+        self.source_columns = []
+        self.occupancy_grid = None
+        # Counters/histograms of routing, platform and spacing decisions
+        from decision_metrics import DecisionMetrics
+        self.decision_metrics = DecisionMetrics()
+        # Trains per (line, event), kept current by _set_train_state; a line's
+        # cached scores are dropped whenever its LINE_SCORE_EVENTS count changes
+        self.line_occupancy = Counter()
+        self.occupancy_version = {line: 0 for line in LineType}
+        self._line_scores = {line: {} for line in LineType}
+        self.line_score_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
         
     def _initialize_stations(self) -> Dict[str, Station]:
-        """Initialize station infrastructure based on position ranges"""
-        stations = {
-            "Mumbai Central": Station("Mumbai Central", 0, platforms=6),
-            "Dadar": Station("Dadar", 15000, platforms=4),
-            "Bandra": Station("Bandra", 25000, platforms=3),
-            "Andheri": Station("Andheri", 35000, platforms=4),
-            "Borivali": Station("Borivali", 50000, platforms=3),
-            "Vasai": Station("Vasai", 70000, platforms=2),
-            "Thane": Station("Thane", 92000, platforms=3)  # Your specific requirement
-        }
-        return stations
+        """Initialize station infrastructure from the topology"""
+        return self.topology.build_stations()
     
     def get_station_by_position(self, position: float) -> Optional[Station]:
         """Get station based on train position"""
@@ -156,11 +193,41 @@ class RailwayOptimizer:
             if station.name.lower() == name.lower():
                 return station
         return None
-    def load_simulation_data(self, csv_path: str) -> pd.DataFrame:
-        """Load simulation data from CSV"""
+    def load_simulation_data(self, csv_path: str, use_cache: bool = False) -> pd.DataFrame:
+        """Load simulation data from CSV
+
+        With use_cache, the parsed frame and fleet are kept in a sidecar
+        directory next to the CSV (fleet_cache.py) and loaded from there
+        while the CSV is unchanged.
+        """
+        if use_cache and len(self.trains) == 0:
+            from fleet_cache import load_fleet_cache, save_fleet_cache, fingerprint, unchanged_since
+            df = load_fleet_cache(self, csv_path)
+            if df is not None:
+                logger.info(f"Loaded {len(self.trains)} trains from the fleet cache of {csv_path}")
+                return df
+            source = fingerprint(csv_path)
+            df = self.load_simulation_data(csv_path)
+            if unchanged_since(csv_path, source):  # not modified while parsing
+                try:
+                    save_fleet_cache(self, csv_path, df, source)
+                except OSError as e:
+                    logger.warning(f"Could not write the fleet cache for {csv_path}: {e}")
+            return df
+        
         logger.info(f"Loading simulation data from {csv_path}")
-        df = pd.read_csv(csv_path)
+        from encoding import CSV_DTYPES
+        with open(csv_path, 'rb') as f:
+            df = pd.read_csv(f, dtype=CSV_DTYPES)
+            # Remember where parsing stopped so appended rows can be ingested later
+            self.source_path = csv_path
+            self.source_offset = f.tell()
+        self.source_columns = list(df.columns)
 
+        return self.load_simulation_frame(df)
+    
+    def load_simulation_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Load simulation data from an already parsed frame"""
         # Convert timestamps
         df['timestamp'] = pd.to_datetime(df['timestamp'])
 
@@ -169,7 +236,53 @@ class RailwayOptimizer:
             station.current_occupancy = 0
             station.platform_assignments = {i: None for i in range(1, station.platforms + 1)}
 
-        # Create train objects
+        self._ingest_records(df)
+        self.refresh_line_occupancy()
+
+        logger.info(f"Loaded {len(self.trains)} trains from simulation data")
+        return df
+
+    def load_simulation_archive(self, archive, start=None, end=None) -> pd.DataFrame:
+        """Load a time window of a memory-mapped trajectory archive (path or TrajectoryArchive)"""
+        from trajectory_archive import TrajectoryArchive
+        if isinstance(archive, str):
+            archive = TrajectoryArchive(archive)
+        logger.info(f"Loading simulation data from archive {archive.path}")
+        return self.load_simulation_frame(archive.window(start, end))
+
+    def ingest_appended_data(self) -> Tuple[pd.DataFrame, List[str]]:
+        """Parse only the rows appended to the source CSV since the last load.
+
+        Returns the new rows and the ids of trains first seen in them.
+        """
+        if self.source_path is None:
+            raise ValueError("No source loaded; call load_simulation_data first")
+
+        with open(self.source_path, 'rb') as f:
+            f.seek(0, io.SEEK_END)
+            if f.tell() < self.source_offset:
+                raise ValueError(f"{self.source_path} was truncated; reload it from scratch")
+            f.seek(self.source_offset)
+            appended = f.read()
+
+        # Leave a partially written last line for the next poll
+        complete = appended.rfind(b'\n') + 1
+        if complete == 0:
+            return pd.DataFrame(columns=self.source_columns), []
+        self.source_offset += complete
+
+        from encoding import CSV_DTYPES
+        df = pd.read_csv(io.BytesIO(appended[:complete]), header=None, names=self.source_columns, dtype=CSV_DTYPES)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        new_train_ids = self._ingest_records(df)
+        self.refresh_line_occupancy()
+
+        logger.info(f"Ingested {len(df)} appended records ({len(new_train_ids)} new trains)")
+        return df, new_train_ids
+    
+    def _ingest_records(self, df: pd.DataFrame) -> List[str]:
+        """Create train objects for trains not seen before and return their ids"""
+        new_train_ids = []
         for _, row in df.iterrows():
             train_id = row['train_id']
             if train_id not in self.trains:
@@ -198,6 +311,8 @@ class RailwayOptimizer:
                 )
 
                 self.trains[train_id] = train
+                train = self.trains[train_id]
+                new_train_ids.append(train_id)
 
                 # Assign platform occupancy
                 if pd.notna(row['station']):
@@ -206,21 +321,37 @@ class RailwayOptimizer:
                         platform = station.assign_platform(train_id)
                         train.platform_assigned = platform
 
-        logger.info(f"Loaded {len(self.trains)} trains from simulation data")
-        return df
+        return new_train_ids
     
-    def detect_conflicts(self) -> List[Dict]:
-        """Detect headway violations and platform conflicts"""
+    def detect_conflicts(self, train_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Detect headway violations and platform conflicts
+
+        With train_ids, only the timestamp/line groups containing those trains
+        are checked and the new conflicts are appended to self.conflicts.
+        """
+        from occupancy_grid import OccupancyGrid
         conflicts = []
         
-        # Group trains by timestamp and line
+        # Only trains whose own or neighbouring block is occupied can violate the headway
+        self.occupancy_grid = OccupancyGrid.from_trains(self.trains, self.track_length, self.headway_minimum)
+        all_trains = list(self.trains.values())
+        
+        # Group candidate trains by timestamp and line
         time_line_groups = defaultdict(list)
-        for train in self.trains.values():
+        for i in self.occupancy_grid.candidate_order(self.headway_minimum):
+            train = all_trains[i]
             key = (train.timestamp, train.current_line)
             time_line_groups[key].append(train)
         
+        affected_keys = None
+        if train_ids is not None:
+            train_ids = set(train_ids)
+            affected_keys = {(self.trains[tid].timestamp, self.trains[tid].current_line) for tid in train_ids}
+        
         # Check headway violations
         for (timestamp, line), trains_on_line in time_line_groups.items():
+            if affected_keys is not None and (timestamp, line) not in affected_keys:
+                continue
             if len(trains_on_line) > 1:
                 # Sort by position
                 trains_sorted = sorted(trains_on_line, key=lambda t: t.current_position)
@@ -231,15 +362,23 @@ class RailwayOptimizer:
                     distance = train2.current_position - train1.current_position
                     
                     if distance < self.headway_minimum:
+                        if train_ids is not None and train1.train_id not in train_ids and train2.train_id not in train_ids:
+                            continue
                         conflicts.append({
                             'type': 'headway_violation',
                             'trains': [train1.train_id, train2.train_id],
                             'line': line,
                             'distance': distance,
+                            'position': train1.current_position,
                             'timestamp': timestamp,
                             'severity': self.headway_minimum - distance
                         })
         
+        if train_ids is not None:
+            self.conflicts.extend(conflicts)
+            logger.info(f"Detected {len(conflicts)} new conflicts")
+            return conflicts
+        
         # Check platform capacity violations
         for station_name, station in self.stations.items():
             if station.current_occupancy > station.platforms:
@@ -256,6 +395,51 @@ class RailwayOptimizer:
         logger.info(f"Detected {len(conflicts)} conflicts")
         return conflicts
     
+    def refresh_line_occupancy(self):
+        """Recount trains per (line, event) after the fleet was replaced or changed directly"""
+        if isinstance(self.trains, dict):
+            self.line_occupancy = Counter((t.current_line, t.event) for t in self.trains.values())
+        else:
+            from encoding import LINES, EVENTS
+            codes = self.trains.column('line').astype(np.int64) * len(EVENTS) + self.trains.column('event')
+            counts = np.bincount(codes, minlength=len(LINES) * len(EVENTS))
+            self.line_occupancy = Counter({(LINES[code // len(EVENTS)], EVENTS[code % len(EVENTS)]): int(count)
+                                           for code, count in enumerate(counts) if count})
+        for line in LineType:
+            self._invalidate_line_scores(line)
+    
+    def _invalidate_line_scores(self, line: LineType):
+        self.occupancy_version[line] += 1
+        self._line_scores[line].clear()
+        self.line_score_stats['invalidations'] += 1
+    
+    def _set_train_state(self, train: Train, line: Optional[LineType] = None, event: Optional[EventType] = None):
+        """Change a train's line and/or event, keeping line_occupancy and the score cache current"""
+        old_line, old_event = train.current_line, train.event
+        if line is not None:
+            train.current_line = line
+        if event is not None:
+            train.event = event
+        new_line, new_event = train.current_line, train.event
+        if (new_line, new_event) == (old_line, old_event):
+            return
+        self.line_occupancy[(old_line, old_event)] -= 1
+        self.line_occupancy[(new_line, new_event)] += 1
+        
+        old_scored, new_scored = old_event in LINE_SCORE_EVENTS, new_event in LINE_SCORE_EVENTS
+        if old_line == new_line:
+            if old_scored != new_scored:
+                self._invalidate_line_scores(new_line)
+        else:
+            if old_scored:
+                self._invalidate_line_scores(old_line)
+            if new_scored:
+                self._invalidate_line_scores(new_line)
+    
+    def _count_trains_on_line(self, line: LineType, events: List[EventType]) -> int:
+        """Count trains on a line whose current event is one of events"""
+        return sum(self.line_occupancy[(line, event)] for event in events)
+    
     def calculate_disruption_risk(self, train: Train) -> float:
         """Calculate disruption risk based on train type and conditions"""
         base_risk = train.config.disruption_probability # pyright: ignore[reportOptionalMemberAccess]
@@ -265,8 +449,7 @@ class RailwayOptimizer:
         
         # Adjust based on line congestion
         congestion_factor = 1.0
-        trains_on_line = sum(1 for t in self.trains.values() 
-                           if t.current_line == train.current_line and t.event == EventType.MOVING)
+        trains_on_line = self._count_trains_on_line(train.current_line, [EventType.MOVING])
         if trains_on_line > 5:
             congestion_factor = 1.5
         
@@ -282,20 +465,12 @@ class RailwayOptimizer:
     def optimize_routing(self, train: Train) -> LineType:
         """Dynamically optimize train routing"""
         current_line = train.current_line
-        alternative_lines = []
-        
-        # Determine available alternatives based on current position and direction
-        if current_line == LineType.SINGLE_UP:
-            alternative_lines = [LineType.CENTRAL, LineType.LOOP]
-        elif current_line == LineType.SINGLE_DOWN:
-            alternative_lines = [LineType.CENTRAL, LineType.LOOP]
-        elif current_line == LineType.CENTRAL:
-            alternative_lines = [LineType.LOOP, LineType.SINGLE_UP, LineType.SINGLE_DOWN]
-        elif current_line == LineType.LOOP:
-            alternative_lines = [LineType.CENTRAL]
+        
+        # Determine available alternatives from the crossovers in the train's section
+        alternative_lines = self.topology.alternative_lines(current_line, train.current_position)
         
         best_line = current_line
-        best_score = self._evaluate_line_score(current_line, train)
+        current_score = best_score = self._evaluate_line_score(current_line, train)
         
         for alt_line in alternative_lines:
             score = self._evaluate_line_score(alt_line, train)
@@ -304,18 +479,35 @@ class RailwayOptimizer:
                 best_line = alt_line
         
         if best_line != current_line:
-            logger.info(f"Rerouting train {train.train_id} from {current_line.value} to {best_line.value}")
+            self.decision_metrics.observe('reroute_score_gain', best_score - current_score)
+            self.decision_metrics.record('route_proposal', train.train_id)
             train.route_history.append(best_line)
         
         return best_line
     
     def _evaluate_line_score(self, line: LineType, train: Train) -> float:
-        """Evaluate how suitable a line is for a train"""
+        """Evaluate how suitable a line is for a train
+
+        The score depends only on the line's occupancy, the train type and
+        whether the line is in the train's route history, so it is cached
+        per line on (train type, in history) until the line's occupancy changes.
+        """
+        in_history = line in train.route_history
+        cache = self._line_scores[line]
+        key = (train.train_type, in_history)
+        score = cache.get(key)
+        if score is not None:
+            self.line_score_stats['hits'] += 1
+            return score
+        self.line_score_stats['misses'] += 1
+        score = cache[key] = self._score_line(line, train, in_history)
+        return score
+    
+    def _score_line(self, line: LineType, train: Train, in_history: bool) -> float:
         score = 100.0  # Base score
         
         # Count trains currently on this line
-        trains_on_line = sum(1 for t in self.trains.values() 
-                           if t.current_line == line and t.event in [EventType.MOVING, EventType.HALTED])
+        trains_on_line = self._count_trains_on_line(line, LINE_SCORE_EVENTS)
         
         # Penalize congested lines
         congestion_penalty = trains_on_line * 10
@@ -326,7 +518,7 @@ class RailwayOptimizer:
         score += priority_bonus
         
         # Penalize if train has already used this line (avoid back-and-forth)
-        if line in train.route_history:
+        if in_history:
             score -= 20
         
         # Special handling for freight on single lines
@@ -359,11 +551,12 @@ class RailwayOptimizer:
         
         # If arriving train has higher priority, evict lower priority train
         if evict_candidate and arriving_train.config.priority < lowest_priority: # type: ignore
-            logger.info(f"Evicting train {evict_candidate} from platform {evict_platform} for higher priority train {arriving_train.train_id}")
+            self.decision_metrics.record('eviction', evict_candidate, station=station.name, platform=evict_platform,
+                                         by=arriving_train.train_id)
             station.release_platform(evict_candidate)
             # Mark evicted train as rerouted
             if evict_candidate in self.trains:
-                self.trains[evict_candidate].event = EventType.REROUTED
+                self._set_train_state(self.trains[evict_candidate], event=EventType.REROUTED)
             return station.assign_platform(arriving_train.train_id)
         
         return None
@@ -382,8 +575,7 @@ class RailwayOptimizer:
             speed_factor = 1.0
         
         # Adjust for line congestion
-        trains_on_line = sum(1 for t in self.trains.values() 
-                           if t.current_line == train.current_line and t.event == EventType.MOVING)
+        trains_on_line = self._count_trains_on_line(train.current_line, [EventType.MOVING])
         if trains_on_line > 3:
             speed_factor *= 0.85  # Reduce speed in congested areas
         
@@ -408,10 +600,9 @@ class RailwayOptimizer:
                 for i, train in enumerate(trains_sorted[1:], 1):
                     new_line = self.optimize_routing(train)
                     if new_line != train.current_line:
-                        train.current_line = new_line
-                        train.event = EventType.REROUTED
+                        self.decision_metrics.reroute(train.train_id, train.current_line, new_line, 'headway_conflict')
+                        self._set_train_state(train, new_line, EventType.REROUTED)
                         conflicts_resolved += 1
-                        logger.info(f"Resolved headway conflict: rerouted {train.train_id}")
             
             elif conflict['type'] == 'platform_overflow':
                 station = self.stations[conflict['station']]
@@ -420,11 +611,22 @@ class RailwayOptimizer:
         
         logger.info(f"Resolved {conflicts_resolved} conflicts")
     
-    def resolve_conflicts_with_spacing(self):
+    def resolve_conflicts_with_spacing(self, conflicts: Optional[List[Dict]] = None):
         """Resolve conflicts while maintaining better train spacing"""
+        if self.spacing_resolver == "legacy":
+            self._resolve_conflicts_with_fixed_spacing(conflicts)
+            return
+        from spacing import resolve_spacing_fixpoint, merge_spacing_stats
+        stats = resolve_spacing_fixpoint(self, conflicts, self.spacing_max_iterations)
+        self.spacing_stats = stats if self.spacing_stats is None else merge_spacing_stats(self.spacing_stats, stats)
+        logger.info(f"Re-spaced {stats['trains_moved']} trains in {stats['iterations']} passes, "
+                    f"{stats['residual_conflicts']} headway violations left")
+    
+    def _resolve_conflicts_with_fixed_spacing(self, conflicts: Optional[List[Dict]] = None):
+        """Legacy resolver: shift trailing trains by spacing_step * i and reroute every second one"""
         conflicts_resolved = 0
         
-        for conflict in self.conflicts:
+        for conflict in (self.conflicts if conflicts is None else conflicts):
             if conflict['type'] == 'headway_violation':
                 trains_involved = [self.trains[tid] for tid in conflict['trains'] if tid in self.trains]
                 
@@ -434,20 +636,22 @@ class RailwayOptimizer:
                 # Instead of just rerouting, try spacing adjustment first
                 for i, train in enumerate(trains_sorted[1:], 1):
                     # Try to improve spacing by adjusting position slightly
-                    position_adjustment = 600  # Add 600m spacing
+                    position_adjustment = self.spacing_step  # Add 600m spacing by default
                     train.current_position += position_adjustment * i
+                    self.decision_metrics.observe('spacing_adjustment_m', position_adjustment * i)
                     
                     # If still too close or other issues, then reroute
                     if i % 2 == 0:  # Reroute every second train to spread load
                         new_line = self.optimize_routing(train)
                         if new_line != train.current_line:
-                            train.current_line = new_line
-                            train.event = EventType.REROUTED
+                            self.decision_metrics.reroute(train.train_id, train.current_line, new_line, 'spacing')
+                            self._set_train_state(train, new_line, EventType.REROUTED)
                             conflicts_resolved += 1
-                            logger.info(f"Spaced and rerouted {train.train_id} for better headway")
+                        else:
+                            self.decision_metrics.record('spacing_move', train.train_id)
                     else:
                         conflicts_resolved += 1
-                        logger.info(f"Improved spacing for {train.train_id}")
+                        self.decision_metrics.record('spacing_move', train.train_id)
         
         logger.info(f"Resolved {conflicts_resolved} conflicts with better spacing")
     
@@ -456,8 +660,8 @@ class RailwayOptimizer:
         moving_trains = sum(1 for t in self.trains.values() if t.event == EventType.MOVING)
         total_trains = len(self.trains)
         
-        # Target: at least 50% of trains should be moving
-        target_moving = int(total_trains * 0.5)
+        # Target: at least 50% of trains should be moving (active_train_ratio)
+        target_moving = int(total_trains * self.active_train_ratio)
         
         if moving_trains < target_moving:
             # Reactivate some trains
@@ -472,18 +676,20 @@ class RailwayOptimizer:
             
             for i in range(trains_to_activate):
                 train = inactive_trains[i]
-                train.event = EventType.MOVING
+                self._set_train_state(train, event=EventType.MOVING)
                 train.current_speed = self.apply_speed_optimization(train)
-                logger.info(f"Reactivated train {train.train_id} to maintain system activity")
+                self.decision_metrics.record('reactivation', train.train_id, reason='active_ratio')
             
             logger.info(f"Ensured {moving_trains + trains_to_activate} trains are active")
     
-    def simulate_disruptions(self):
+    def simulate_disruptions(self, trains: Optional[List[Train]] = None):
         """Simulate random disruptions based on probability models (more conservative)"""
+        if trains is None:
+            trains = list(self.trains.values())
         disruption_count = 0
-        max_disruptions = max(3, int(len(self.trains) * 0.05))  # Max 5% of trains disrupted
+        max_disruptions = max(3, int(len(trains) * self.max_disruption_ratio))  # Max 5% of trains disrupted by default
         
-        for train in self.trains.values():
+        for train in trains:
             if disruption_count >= max_disruptions:
                 break
                 
@@ -496,110 +702,436 @@ class RailwayOptimizer:
                 # Apply disruption
                 disruption_severity = random.uniform(0.8, 1.3)
                 train.disruption_factor = disruption_severity
+                self.decision_metrics.observe('disruption_severity', disruption_severity)
                 
                 if disruption_severity < 1.0:
                     # Minor disruption - slight delay, keep moving
                     additional_delay = random.uniform(1, 3)
                     train.delay_minutes += additional_delay
-                    train.event = EventType.DELAYED
+                    self._set_train_state(train, event=EventType.DELAYED)
                     # Keep train moving with reduced speed
                     train.current_speed = max(train.current_speed * 0.8, 20)
+                    self.decision_metrics.record('delay', train.train_id, minutes=additional_delay)
                 else:
                     # Moderate disruption - temporary halt
-                    train.event = EventType.HALTED
+                    self._set_train_state(train, event=EventType.HALTED)
                     train.current_speed = 0
-                    logger.info(f"Train {train.train_id} temporarily halted due to disruption")
+                    self.decision_metrics.record('halt', train.train_id)
                 
                 disruption_count += 1
         
         logger.info(f"Applied {disruption_count} controlled disruptions")
     
-    def optimize_schedule(self) -> pd.DataFrame:
-        """Main optimization routine"""
+    def optimize_schedule(self, solver: str = "greedy", cluster_time_limit: float = 5.0,
+                          deadline: Optional[float] = None, resume: bool = False,
+                          materialize: bool = True) -> Optional[pd.DataFrame]:
+        """Main optimization routine
+
+        solver="exact" resolves headway conflict clusters with a MILP (needs
+        PuLP) under a per-cluster time limit, falling back to the greedy
+        spacing rules when no solution is found.
+
+        deadline is a wall-clock budget in seconds: the greedy plan is built
+        first and the rest of the budget goes to local search, keeping the
+        best plan found.
+
+        With checkpoint_dir set, the state is checkpointed every
+        checkpoint_interval seconds between steps and routing batches.
+        resume=True continues from the last checkpoint in checkpoint_dir
+        and gives the same result as an uninterrupted run.
+
+        materialize=False skips building the output frame and returns None;
+        stream it with write_output() or iter_output_chunks() instead.
+        """
         logger.info("Starting schedule optimization...")
+        started = time.perf_counter()
+        progress = {'step': 0, 'routed': 0, 'reference': None}
+        if resume:
+            progress = self.resume_from_checkpoint()
+        elif self.checkpoint_dir is not None:
+            from checkpoint import CheckpointWriter
+            self._checkpoint = CheckpointWriter(self.checkpoint_dir, self.checkpoint_interval)
+        if deadline is not None and progress['reference'] is None:
+            from anytime import baseline
+            progress['reference'] = baseline(self)
         
         # Step 1: Detect conflicts
-        self.detect_conflicts()
+        if progress['step'] < 1:
+            self.detect_conflicts()
+            self._save_checkpoint(progress, step=1)
         
         # Step 2: Simulate disruptions (more controlled)
-        self.simulate_disruptions()
+        if progress['step'] < 2:
+            self.simulate_disruptions()
+            self._save_checkpoint(progress, step=2)
         
         # Step 3: Optimize routing and platform allocation
-        for train in self.trains.values():
-            # Preserve moving trains - don't make everything static
-            if train.event == EventType.MOVING:
-                # Speed optimization for moving trains
-                optimized_speed = self.apply_speed_optimization(train)
-                train.current_speed = optimized_speed
-                
-                # Only reroute if there's a significant benefit
-                optimized_line = self.optimize_routing(train)
-                if optimized_line != train.current_line:
-                    # Calculate benefit score before rerouting
-                    current_score = self._evaluate_line_score(train.current_line, train)
-                    new_score = self._evaluate_line_score(optimized_line, train)
-                    
-                    # Only reroute if significant improvement (>20 points)
-                    if new_score > current_score + 20:
-                        train.current_line = optimized_line
-                        train.event = EventType.REROUTED
-                        logger.info(f"Beneficial rerouting: {train.train_id} to {optimized_line.value}")
-            
-            elif train.event in [EventType.HALTED, EventType.DELAYED]:
-                # Try to get halted/delayed trains moving
-                optimized_line = self.optimize_routing(train)
-                if optimized_line != train.current_line:
-                    train.current_line = optimized_line
-                    train.event = EventType.MOVING  # Get train moving again
-                    train.current_speed = self.apply_speed_optimization(train)
-                    logger.info(f"Reactivated train {train.train_id} on {optimized_line.value}")
-            
-            # Platform optimization at stations
-            station = self.get_station_by_position(train.current_position)
-            if station and train.event == EventType.ARRIVED:
-                platform = self.optimize_platform_allocation(station, train)
-                train.platform_assigned = platform
+        if progress['step'] < 3:
+            self._optimize_trains(list(self.trains.values()), progress)
+            self._save_checkpoint(progress, step=3)
         
         # Step 4: Resolve remaining conflicts with better spacing
-        self.resolve_conflicts_with_spacing()
+        if progress['step'] < 4:
+            if solver == "exact":
+                from exact_solver import resolve_conflicts_exact
+                self.exact_solver_stats = resolve_conflicts_exact(self, cluster_time_limit)
+            else:
+                self.resolve_conflicts_with_spacing()
+            self._save_checkpoint(progress, step=4)
         
         # Step 5: Ensure we have active trains
-        self.ensure_active_trains()
+        if progress['step'] < 5:
+            self.ensure_active_trains()
+            self._save_checkpoint(progress, step=5)
+        reference = progress['reference']
+        
+        # Step 5b: Improve the plan until the deadline
+        if deadline is not None:
+            from anytime import improve_schedule
+            self.anytime_stats = improve_schedule(self, reference, started + deadline, started)
+            self.anytime_stats['deadline_seconds'] = deadline
+        
+        if self._checkpoint is not None:
+            self.checkpoint_stats = self._checkpoint.stats
+            self._checkpoint = None
+        if not materialize:
+            return None
         
         # Step 6: Generate optimized dataset
         optimized_data = self._generate_output_data()
         logger.info(f"Generated optimized data shape: {optimized_data.shape}")
         return optimized_data
     
-    def _generate_output_data(self) -> pd.DataFrame:
-        """Generate optimized simulation output with temporal sequences"""
-        output_records = []
+    def resume_from_checkpoint(self) -> Dict:
+        """Restore the state saved in checkpoint_dir; returns how far optimize_schedule got"""
+        from checkpoint import CheckpointWriter, restore_optimizer
+        if self.checkpoint_dir is None:
+            raise ValueError("Set checkpoint_dir to resume from a checkpoint")
+        progress = restore_optimizer(self, self.checkpoint_dir)
+        self._checkpoint = CheckpointWriter.resume(self.checkpoint_dir, self.checkpoint_interval)
+        logger.info(f"Resumed from checkpoint generation {self._checkpoint.generation} "
+                    f"(step {progress['step']}, {progress['routed']} trains routed)")
+        return progress
+    
+    def _save_checkpoint(self, progress: Dict, **update):
+        """Record progress and checkpoint if the interval has passed"""
+        progress.update(update)
+        if self._checkpoint is not None and self._checkpoint.due():
+            from checkpoint import save_optimizer
+            save_optimizer(self, self._checkpoint, progress)
+    
+    def _optimize_trains(self, trains: List[Train], progress: Optional[Dict] = None):
+        """Route trains in chunks of whole batches, checkpointing between chunks"""
+        chunk = (self.routing_batch_size or 1) * ROUTING_CHECKPOINT_BATCHES
+        start = progress['routed'] if progress else 0
+        for offset in range(start, len(trains), chunk):
+            part = trains[offset:offset + chunk]
+            if self.routing_batch_size is None:
+                for train in part:
+                    self._optimize_train(train)
+            else:
+                self.optimize_routing_batch(part, self.routing_batch_size)
+            if progress is not None:
+                self._save_checkpoint(progress, routed=offset + len(part))
+    
+    def _routing_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per section: allowed (from line, to line) moves and each move's rank in optimize_routing's candidate order"""
+        if getattr(self, '_route_tables', None) is None:
+            lines = list(LineType)
+            n_sections, n_lines = len(self.topology.sections), len(lines)
+            allowed = np.zeros((n_sections, n_lines, n_lines), dtype=bool)
+            rank = np.full((n_sections, n_lines, n_lines), n_lines + 1, dtype=np.int64)
+            for s, section in enumerate(self.topology.sections):
+                for i, line in enumerate(lines):
+                    allowed[s, i, i] = True
+                    rank[s, i, i] = 0
+                    for order, alt in enumerate(self.topology.alternative_lines(line, section.start), 1):
+                        j = lines.index(alt)
+                        if not allowed[s, i, j]:
+                            allowed[s, i, j] = True
+                            rank[s, i, j] = order
+            self._route_tables = (allowed, rank)
+        return self._route_tables
+    
+    def _batch_state(self, batch: List[Train]) -> Dict[str, np.ndarray]:
+        """Type/line/event codes, numeric fields and route-history mask of a batch of trains"""
+        from encoding import LINES, TRAIN_TYPE_CODES, LINE_CODES, EVENT_CODES
+        if isinstance(self.trains, dict):
+            return {
+                'type': np.array([TRAIN_TYPE_CODES[t.train_type] for t in batch], dtype=np.int64),
+                'line': np.array([LINE_CODES[t.current_line] for t in batch], dtype=np.int64),
+                'event': np.array([EVENT_CODES[t.event] for t in batch], dtype=np.int64),
+                'position': np.array([t.current_position for t in batch], dtype=np.float64),
+                'delay': np.array([t.delay_minutes for t in batch], dtype=np.float64),
+                'disruption': np.array([t.disruption_factor for t in batch], dtype=np.float64),
+                'history': np.array([[line in t.route_history for line in LINES] for t in batch], dtype=bool)
+                           .reshape(len(batch), len(LINES)),
+            }
+        table = self.trains
+        rows = table.rows_of(batch)
+        return {
+            'rows': rows,
+            'type': table.train_type[rows].astype(np.int64),
+            'line': table.line[rows].astype(np.int64),
+            'event': table.event[rows].astype(np.int64),
+            'position': table.position[rows],
+            'delay': table.delay_minutes[rows],
+            'disruption': table.disruption_factor[rows],
+            'history': table.route_mask(rows),
+        }
+    
+    def _line_score_matrix(self, state: Dict[str, np.ndarray]) -> np.ndarray:
+        """_evaluate_line_score for every train (rows) and line (columns, LineType order)"""
+        from encoding import CONFIG_TABLE, TRAIN_TYPE_CODES
+        lines = list(LineType)
+        occupancy = np.array([self._count_trains_on_line(line, LINE_SCORE_EVENTS) for line in lines], dtype=np.float64)
+        priority = CONFIG_TABLE['priority'][state['type']].astype(np.float64)
+        freight = state['type'] == TRAIN_TYPE_CODES[TrainType.FREIGHT]
+        express = np.isin(state['type'], [TRAIN_TYPE_CODES[TrainType.EXPRESS], TRAIN_TYPE_CODES[TrainType.SUPERFAST]])
+        single = np.array([line in (LineType.SINGLE_UP, LineType.SINGLE_DOWN) for line in lines])
+        central = np.array([line == LineType.CENTRAL for line in lines])
+        
+        scores = 100.0 - occupancy[None, :] * 10 + ((6 - priority) * 5)[:, None] - state['history'] * 20.0
+        scores += (freight[:, None] & single[None, :]) * 15.0
+        scores += (express[:, None] & central[None, :]) * 10.0
+        return np.maximum(scores, 0)
+    
+    def _batch_speeds(self, state: Dict[str, np.ndarray], index: np.ndarray, line_codes: np.ndarray) -> np.ndarray:
+        """apply_speed_optimization for the trains at index against the current occupancy"""
+        from encoding import CONFIG_TABLE
+        moving = np.array([self._count_trains_on_line(line, [EventType.MOVING]) for line in LineType])
+        base = CONFIG_TABLE['base_speed'][state['type'][index]]
+        delay = state['delay'][index]
+        factor = np.where(delay < 0, 0.9, np.where(delay > 10, np.minimum(1.2, 1 + delay / 100), 1.0))
+        factor = np.where(moving[line_codes] > 3, factor * 0.85, factor) * state['disruption'][index]
+        return np.maximum(base * factor, 20)
+    
+    def _assign_speeds(self, batch: List[Train], state: Dict[str, np.ndarray], index: np.ndarray, speeds: np.ndarray):
+        if 'rows' in state:
+            self.trains.speed[state['rows'][index]] = speeds
+        else:
+            for k, speed in zip(index, speeds):
+                batch[k].current_speed = float(speed)
+    
+    def optimize_routing_batch(self, trains: List[Train], batch_size: int = 256):
+        """_optimize_train for many trains, scoring each batch as a trains x lines matrix.
+
+        Best lines come from one argmax per batch (ties go to the current line,
+        then to the first crossover, as in optimize_routing) and the >20 point
+        rule is a mask. A reroute or reactivation changes line occupancy, so
+        the batch is applied up to the first such train and the rest is
+        re-scored against the updated occupancy; any batch_size reproduces
+        the one-at-a-time pass exactly.
+        """
+        batch_size = max(1, batch_size)
+        for start in range(0, len(trains), batch_size):
+            batch = trains[start:start + batch_size]
+            while batch:
+                batch = self._route_batch(batch)
+    
+    def _route_batch(self, batch: List[Train]) -> List[Train]:
+        """Route a batch up to and including its first occupancy change; returns the trains left"""
+        from encoding import EVENT_CODES
+        lines = list(LineType)
+        allowed, rank = self._routing_tables()
+        state = self._batch_state(batch)
+        current, events = state['line'], state['event']
+        moving = events == EVENT_CODES[EventType.MOVING]
+        routed = moving | np.isin(events, [EVENT_CODES[EventType.HALTED], EVENT_CODES[EventType.DELAYED]])
+        
+        # Score every allowed line; ties prefer the lower candidate rank
+        scores = self._line_score_matrix(state)
+        sections = self.topology.section_indices(state['position'])
+        key = np.where(allowed[sections, current], scores * (len(lines) + 2) - rank[sections, current], -np.inf)
+        best = np.argmax(key, axis=1)
+        rows = np.arange(len(batch))
+        current_score = scores[rows, current]
+        proposed = routed & (best != current)
+        
+        # optimize_routing adds the proposed line to the route history before the rescoring
+        new_score = np.maximum(scores[rows, best] - np.where(state['history'][rows, best], 0, 20), 0)
+        beneficial = proposed & moving & (new_score > current_score + 20)
+        reactivated = proposed & ~moving
+        
+        # Later trains were scored against occupancy the first change invalidates
+        changes = np.flatnonzero(beneficial | reactivated)
+        done = changes[0] + 1 if len(changes) else len(batch)
+        
+        # Speed optimization for moving trains
+        index = np.flatnonzero(moving[:done])
+        self._assign_speeds(batch, state, index, self._batch_speeds(state, index, current[index]))
+        
+        for k in np.flatnonzero(proposed[:done]):
+            train, best_line = batch[k], lines[best[k]]
+            self.decision_metrics.observe('reroute_score_gain', scores[k, best[k]] - current_score[k])
+            self.decision_metrics.record('route_proposal', train.train_id)
+            train.route_history.append(best_line)
+            if beneficial[k]:
+                self.decision_metrics.reroute(train.train_id, train.current_line, best_line, 'beneficial')
+                self._set_train_state(train, best_line, EventType.REROUTED)
+            elif reactivated[k]:
+                self.decision_metrics.reroute(train.train_id, train.current_line, best_line, 'reactivation')
+                self._set_train_state(train, best_line, EventType.MOVING)
+        
+        revived = np.flatnonzero(reactivated[:done])
+        if len(revived):
+            self._assign_speeds(batch, state, revived, self._batch_speeds(state, revived, best[revived]))
+            for k in revived:
+                self.decision_metrics.record('reactivation', batch[k].train_id, reason='reroute')
+        
+        # Platform optimization at stations
+        for k in np.flatnonzero(events[:done] == EVENT_CODES[EventType.ARRIVED]):
+            train = batch[k]
+            station = self.get_station_by_position(train.current_position)
+            if station and train.event == EventType.ARRIVED:
+                train.platform_assigned = self.optimize_platform_allocation(station, train)
+        return batch[done:]
+    
+    def _optimize_train(self, train: Train):
+        """Optimize routing, speed and platform allocation for one train"""
+        # Preserve moving trains - don't make everything static
+        if train.event == EventType.MOVING:
+            # Speed optimization for moving trains
+            optimized_speed = self.apply_speed_optimization(train)
+            train.current_speed = optimized_speed
+        
+            # Only reroute if there's a significant benefit
+            optimized_line = self.optimize_routing(train)
+            if optimized_line != train.current_line:
+                # Calculate benefit score before rerouting
+                current_score = self._evaluate_line_score(train.current_line, train)
+                new_score = self._evaluate_line_score(optimized_line, train)
+        
+                # Only reroute if significant improvement (>20 points)
+                if new_score > current_score + 20:
+                    self.decision_metrics.reroute(train.train_id, train.current_line, optimized_line, 'beneficial')
+                    self._set_train_state(train, optimized_line, EventType.REROUTED)
+        
+        elif train.event in [EventType.HALTED, EventType.DELAYED]:
+            # Try to get halted/delayed trains moving
+            optimized_line = self.optimize_routing(train)
+            if optimized_line != train.current_line:
+                self.decision_metrics.reroute(train.train_id, train.current_line, optimized_line, 'reactivation')
+                self._set_train_state(train, optimized_line, EventType.MOVING)  # Get train moving again
+                train.current_speed = self.apply_speed_optimization(train)
+                self.decision_metrics.record('reactivation', train.train_id, reason='reroute')
         
-        # Get unique timestamps from original data to maintain temporal structure
-        original_timestamps = sorted(set(train.timestamp for train in self.trains.values()))
-        
-        # Generate multiple time snapshots for better visualization
-        for timestamp in original_timestamps:
-            for train in self.trains.values():
-                # Create temporal progression for each train
-                record = {
-                    'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'train_id': train.train_id,
-                    'train_type': train.train_type.value,
-                    'line': train.current_line.value,
-                    'position_m': train.current_position,
-                    'speed_kmph': train.current_speed,
-                    'station': train.station if train.station else '',
-                    'event': train.event.value,
-                    'delay_minutes': train.delay_minutes
-                }
-                output_records.append(record)
+        # Platform optimization at stations
+        station = self.get_station_by_position(train.current_position)
+        if station and train.event == EventType.ARRIVED:
+            platform = self.optimize_platform_allocation(station, train)
+            train.platform_assigned = platform
+        
+    def optimize_incremental(self, train_ids: List[str]) -> pd.DataFrame:
+        """Re-optimize only the given trains after ingest_appended_data"""
+        if not train_ids:
+            return self._generate_output_data()
+        
+        logger.info(f"Starting incremental optimization of {len(train_ids)} trains...")
+        trains = [self.trains[tid] for tid in train_ids]
+        
+        new_conflicts = self.detect_conflicts(train_ids)
+        self.simulate_disruptions(trains)
+        self._optimize_trains(trains)
+        self.resolve_conflicts_with_spacing(new_conflicts)
+        self.ensure_active_trains()
         
-        df = pd.DataFrame(output_records)
+        return self._generate_output_data()
+    
+    def _output_columns(self) -> Tuple[List[datetime], Dict]:
+        """Snapshot timestamps and the per-train output columns repeated at each"""
+        from encoding import TRAIN_TYPE_CODES, LINE_CODES, EVENT_CODES, TRAIN_TYPE_DTYPE, LINE_DTYPE, EVENT_DTYPE
+        
+        trains = list(self.trains.values())
+        
+        # Get unique timestamps from original data to maintain temporal structure
+        original_timestamps = sorted(set(train.timestamp for train in trains))
+        
+        # Every snapshot repeats the final state of every train, so the
+        # columns are built once per train and tiled across timestamps
+        stations = [train.station if train.station else '' for train in trains]
+        station_names = sorted(set(stations))
+        station_codes = {name: code for code, name in enumerate(station_names)}
+        
+        columns = {
+            'train_id': (np.arange(len(trains), dtype=np.int32), pd.CategoricalDtype([train.train_id for train in trains])),
+            'train_type': (np.array([TRAIN_TYPE_CODES[train.train_type] for train in trains], dtype=np.int8), TRAIN_TYPE_DTYPE),
+            'line': (np.array([LINE_CODES[train.current_line] for train in trains], dtype=np.int8), LINE_DTYPE),
+            'position_m': (np.array([train.current_position for train in trains], dtype=np.float64), None),
+            'speed_kmph': (np.array([train.current_speed for train in trains], dtype=np.float64), None),
+            'station': (np.array([station_codes[station] for station in stations], dtype=np.int16), pd.CategoricalDtype(station_names)),
+            'event': (np.array([EVENT_CODES[train.event] for train in trains], dtype=np.int8), EVENT_DTYPE),
+            'delay_minutes': (np.array([train.delay_minutes for train in trains], dtype=np.float64), None),
+        }
+        return original_timestamps, columns
+    
+    @staticmethod
+    def _output_timestamps(timestamps: List[datetime]) -> List[str]:
+        return [timestamp.strftime('%Y-%m-%d %H:%M:%S') for timestamp in timestamps]
+    
+    @staticmethod
+    def _output_frame(timestamps: List[datetime], columns: Dict, start: int = 0) -> pd.DataFrame:
+        """Snapshots of the per-train columns at the given timestamps"""
+        n_trains = len(columns['train_id'][0])
+        data = {'timestamp': np.repeat(RailwayOptimizer._output_timestamps(timestamps), n_trains)}
+        for name, (values, dtype) in columns.items():
+            values = np.tile(values, len(timestamps))
+            data[name] = values if dtype is None else pd.Categorical.from_codes(values, dtype=dtype)
+        df = pd.DataFrame(data)
+        df.index = pd.RangeIndex(start, start + len(df))
         return df
     
-    def generate_optimization_report(self) -> Dict:
-        """Generate comprehensive optimization report with enhanced analytics"""
+    def _generate_output_data(self) -> pd.DataFrame:
+        """Generate optimized simulation output with temporal sequences"""
+        timestamps, columns = self._output_columns()
+        return self._output_frame(timestamps, columns)
+    
+    def iter_output_chunks(self, rows_per_chunk: int = OUTPUT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """The optimized output in timestamp order, whole snapshots per chunk
+
+        Concatenated, the chunks equal _generate_output_data(); only one
+        chunk's worth of rows exists at a time.
+        """
+        timestamps, columns = self._output_columns()
+        per_chunk = max(1, rows_per_chunk // max(1, len(self.trains)))
+        if not timestamps:
+            yield self._output_frame([], columns)
+            return
+        for first in range(0, len(timestamps), per_chunk):
+            yield self._output_frame(timestamps[first:first + per_chunk], columns, first * len(self.trains))
+    
+    def write_output(self, path: str, file_format: Optional[str] = None, compression: Optional[str] = 'infer',
+                     rows_per_chunk: int = OUTPUT_CHUNK_ROWS) -> Dict:
+        """Stream the optimized output to a CSV or Parquet file in bounded memory
+
+        The format and compression follow the file extension unless given
+        (output_writer.py). file_format="changes" (or a .changes path)
+        writes the change-log format instead (change_log.py), one change
+        row per train. Returns the writer stats, also kept in output_stats
+        for the report.
+        """
+        from change_log import CHANGE_LOG_SUFFIX
+        if file_format == 'changes' or (file_format is None and path.endswith(CHANGE_LOG_SUFFIX)):
+            from change_log import write_snapshot_change_log
+            timestamps, columns = self._output_columns()
+            snapshot = self._output_frame(timestamps[:1], columns)
+            self.output_stats = write_snapshot_change_log(snapshot, pd.Series(self._output_timestamps(timestamps)), path)
+            self.output_stats['format'] = 'changes'
+            logger.info(f"Wrote {self.output_stats['rows']} optimized records to {path} "
+                        f"as {self.output_stats['change_rows']} change rows")
+            return self.output_stats
+        from output_writer import write_output
+        self.output_stats = write_output(self.iter_output_chunks(rows_per_chunk), path, file_format, compression)
+        logger.info(f"Wrote {self.output_stats['rows']} optimized records to {path} "
+                    f"in {self.output_stats['chunks']} chunks")
+        return self.output_stats
+    
+    def generate_optimization_report(self, trajectory_df: Optional[pd.DataFrame] = None) -> Dict:
+        """Generate comprehensive optimization report with enhanced analytics
+
+        With trajectory_df (the full simulation time series), the report also
+        gets per-block throughput, running time and occupancy.
+        """
         total_trains = len(self.trains)
         
         # Calculate basic metrics
@@ -749,18 +1281,50 @@ class RailwayOptimizer:
             'efficiency_score': efficiency_score,
         }
         
+        report['decisions'] = self.decision_metrics.summary()
+        # The batched routing pass scores lines as a matrix without the cache
+        lookups = self.line_score_stats['hits'] + self.line_score_stats['misses']
+        if lookups:
+            report['line_score_cache'] = dict(self.line_score_stats, hit_rate=self.line_score_stats['hits'] / lookups)
+        if self.exact_solver_stats is not None:
+            report['exact_solver'] = self.exact_solver_stats
+        if self.anytime_stats is not None:
+            report['anytime'] = self.anytime_stats
+        if self.spacing_stats is not None:
+            report['spacing'] = self.spacing_stats
+        if self.checkpoint_stats is not None:
+            report['checkpoints'] = self.checkpoint_stats
+        if self.partition_stats is not None:
+            report['partitions'] = self.partition_stats
+        if self.output_stats is not None:
+            report['output'] = self.output_stats
+        if trajectory_df is not None:
+            from throughput import compute_throughput, throughput_summary
+            report['throughput'] = throughput_summary(compute_throughput(trajectory_df, self.topology))
+        
         return report
 
 def main():
     """Main optimization workflow"""
+    parser = argparse.ArgumentParser(description="Optimize train_simulation_output_before.csv")
+    parser.add_argument('--checkpoint', metavar='DIR', help="checkpoint directory for long runs")
+    parser.add_argument('--checkpoint-interval', type=float, default=300.0, help="seconds between checkpoints")
+    parser.add_argument('--resume', action='store_true', help="continue from the last checkpoint in --checkpoint")
+    parser.add_argument('--no-cache', action='store_true', help="always re-parse the input instead of using its fleet cache")
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
     # Initialize optimizer
     optimizer = RailwayOptimizer()
+    optimizer.checkpoint_dir = args.checkpoint
+    optimizer.checkpoint_interval = args.checkpoint_interval
     
     # Load simulation data
     input_file = "train_simulation_output_before.csv"
     try:
-        df_input = optimizer.load_simulation_data(input_file)
+        df_input = optimizer.load_simulation_data(input_file, use_cache=not args.no_cache)
         print(f"Loaded {len(df_input)} records from {input_file}")
     except Exception as e:
         print(f"Error loading data: {e}")
@@ -768,16 +1332,16 @@ def main():
     
     # Run optimization
     print("\n Started Optimization\n")
-    df_optimized = optimizer.optimize_schedule()
+    optimizer.optimize_schedule(resume=args.resume, materialize=False)
     
-    # Generate report
-    report = optimizer.generate_optimization_report()
-    
-    # Save optimized data
+    # Stream optimized data to disk, chunk by chunk
     output_file = "train_simulation_output_after.csv"
-    df_optimized.to_csv(output_file, index=False)
+    optimizer.write_output(output_file)
     print(f" Optimized data saved to {output_file}")
     
+    # Generate report
+    report = optimizer.generate_optimization_report(trajectory_df=df_input)
+    
     # Print optimization summary
     print("\n OPTIMIZATION SUMMARY")
     print(f"Total trains processed: {report['total_trains']}")
@@ -792,7 +1356,26 @@ def main():
     for line, usage in report['line_usage'].items():
         print(f"  {line}: {usage} trains")
     
+    decisions = report['decisions']
+    print("\n  DECISIONS")
+    for kind, count in decisions['by_kind'].items():
+        print(f"  {kind}: {count}")
+    for lines, count in decisions['reroutes_by_line'].items():
+        print(f"  reroute {lines}: {count}")
+    
+    if 'spacing' in report:
+        spacing = report['spacing']
+        print(f"  spacing: {spacing['trains_moved']} trains moved in {spacing['iterations']} passes, "
+              f"{spacing['residual_conflicts']} violations left")
+    
+    print("\n  SECTION THROUGHPUT")
+    for block, metrics in report['throughput']['blocks'].items():
+        print(f"  {block}: {metrics['trains_per_hour']:.1f} trains/h, "
+              f"{metrics['occupancy_ratio'] * 100:.0f}% occupied")
+    
     print(f"\n Optimization complete! Use {output_file} as your 'after' dataset.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Run through the importable module so encoding/topology share its enum classes
+    import main as railway_main
+    railway_main.main()
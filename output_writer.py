@@ -0,0 +1,159 @@
+"""
+Chunked Output Writer
+=====================
+
+Streams the optimized dataset to disk without materializing it:
+- RailwayOptimizer.iter_output_chunks yields the output a few whole
+  snapshots at a time, in timestamp order
+- ChunkedWriter appends each chunk to a CSV (optionally gzip/bz2/xz
+  compressed) or Parquet file
+- Chunks are formatted on the calling thread while a background thread
+  compresses and writes the previous ones; a bounded queue keeps at most
+  queue_size chunks in flight, so memory stays flat for any output size
+- The file is written under a .tmp name and renamed into place when
+  complete, so a failed run never leaves a truncated output behind
+
+Parquet needs pyarrow.
+"""
+
+import bz2
+import gzip
+import importlib.util
+import lzma
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+CSV_OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+_DONE = object()
+
+
+def infer_format(path: str) -> str:
+    """'parquet' for .parquet/.pq paths, 'csv' otherwise"""
+    return 'parquet' if path.endswith(('.parquet', '.pq')) else 'csv'
+
+
+def infer_compression(path: str, file_format: str) -> Optional[str]:
+    if file_format == 'parquet':
+        return 'snappy'
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1])
+
+
+def resolve_output(path: str, file_format: Optional[str] = None,
+                   compression: Optional[str] = 'infer') -> Tuple[str, Optional[str]]:
+    """Format and compression for an output path; raises before anything is written"""
+    file_format = file_format or infer_format(path)
+    if file_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {file_format!r} (expected one of {OUTPUT_FORMATS})")
+    compression = infer_compression(path, file_format) if compression == 'infer' else compression
+    if file_format == 'csv' and compression not in (None, *CSV_OPENERS):
+        raise ValueError(f"Unknown CSV compression {compression!r} (expected one of {tuple(CSV_OPENERS)})")
+    if file_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+    return file_format, compression
+
+
+class ChunkedWriter:
+    """Appends DataFrame chunks to a CSV or Parquet file from a background thread"""
+
+    def __init__(self, path: str, file_format: Optional[str] = None, compression: Optional[str] = 'infer',
+                 queue_size: int = 2):
+        self.path = path
+        self.file_format, self.compression = resolve_output(path, file_format, compression)
+        self.stats = {'format': self.file_format, 'compression': self.compression, 'rows': 0, 'chunks': 0,
+                      'bytes': 0, 'format_seconds': 0.0, 'write_seconds': 0.0, 'wait_seconds': 0.0}
+        self._staging = path + '.tmp'
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, name='output-writer', daemon=True)
+        self._thread.start()
+
+    def _open(self, first_chunk):
+        if self.file_format == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self._staging, first_chunk.schema, compression=self.compression)
+        opener = CSV_OPENERS.get(self.compression, open)
+        return opener(self._staging, 'wb')
+
+    def _drain(self):
+        sink = None
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                break
+            if self._error is not None:
+                continue  # keep draining so write() never blocks on a dead writer
+            try:
+                started = time.perf_counter()
+                if sink is None:
+                    sink = self._open(item)
+                if self.file_format == 'parquet':
+                    sink.write_table(item)
+                else:
+                    sink.write(item)
+                self.stats['write_seconds'] += time.perf_counter() - started
+            except Exception as e:
+                self._error = e
+        if sink is not None:
+            try:
+                sink.close()
+            except Exception as e:
+                self._error = self._error or e
+
+    def _format(self, chunk: pd.DataFrame):
+        if self.file_format == 'parquet':
+            import pyarrow as pa
+            return pa.Table.from_pandas(chunk, preserve_index=False)
+        return chunk.to_csv(index=False, header=self.stats['chunks'] == 0).encode()
+
+    def write(self, chunk: pd.DataFrame):
+        if self._error is not None:
+            raise self._error
+        started = time.perf_counter()
+        payload = self._format(chunk)
+        formatted = time.perf_counter()
+        self._queue.put(payload)
+        self.stats['format_seconds'] += formatted - started
+        self.stats['wait_seconds'] += time.perf_counter() - formatted
+        self.stats['rows'] += len(chunk)
+        self.stats['chunks'] += 1
+
+    def close(self, discard: bool = False) -> Dict:
+        """Finish writing and move the file into place (discard=True drops it)"""
+        self._queue.put(_DONE)
+        self._thread.join()
+        if discard or self._error is not None:
+            if os.path.exists(self._staging):
+                os.remove(self._staging)
+            if self._error is not None and not discard:
+                raise self._error
+            return self.stats
+        if self.stats['chunks'] == 0:
+            raise ValueError(f"No output chunks were written to {self.path}")
+        os.replace(self._staging, self.path)
+        self.stats['bytes'] = os.path.getsize(self.path)
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close(discard=exc_type is not None)
+
+
+def write_output(chunks: Iterable[pd.DataFrame], path: str, file_format: Optional[str] = None,
+                 compression: Optional[str] = 'infer', queue_size: int = 2) -> Dict:
+    """Write an iterable of chunks to path; returns rows, bytes and timing stats"""
+    started = time.perf_counter()
+    with ChunkedWriter(path, file_format, compression, queue_size) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    stats = writer.stats
+    stats['seconds'] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Before/After Run Comparison
+===========================
+
+Compares a simulation input with an optimized output record by record:
+- Both runs are read in timestamp order, in chunks, and cut at a common
+  time horizon, so memory is bounded by the chunk size rather than the
+  file size
+- Records are aligned on (train_id, timestamp) with a sorted merge-join
+  (argsort + searchsorted on an integer key); duplicate records keep the
+  first occurrence
+- Per-train and per-line delay and speed deltas, line and event transition
+  matrices, and headway conflicts (adjacent trains on one line closer than
+  the headway at one timestamp, as in detect_conflicts) on each side
+
+All accumulators are fixed-size arrays over train, line and event codes,
+filled with np.bincount.
+"""
+
+import argparse
+import os
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from encoding import CSV_DTYPES, LINES, EVENTS, LINE_DTYPE, EVENT_DTYPE
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+_END = np.iinfo(np.int64).max
+_SIDES = ('before', 'after')
+
+
+def _chunks(source, chunksize: int) -> Iterator[pd.DataFrame]:
+    """A CSV path is streamed as it is; a frame is sorted by time and sliced"""
+    if isinstance(source, pd.DataFrame):
+        times = pd.to_datetime(source['timestamp']).to_numpy(dtype='datetime64[ns]')
+        frame = source.iloc[np.argsort(times, kind='stable')]
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+    else:
+        yield from pd.read_csv(source, dtype=CSV_DTYPES, chunksize=chunksize)
+
+
+def _empty_rows() -> Dict[str, np.ndarray]:
+    rows = {key: np.zeros(0, dtype=np.int64) for key in ('time', 'train', 'line', 'event')}
+    rows.update({key: np.zeros(0) for key in ('delay', 'speed', 'position')})
+    return rows
+
+
+class _TrainCodes:
+    """train_id -> code, shared by both runs and grown chunk by chunk"""
+
+    def __init__(self):
+        self.ids = pd.Index([], dtype=object)
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        values = values.astype('category')
+        categories = pd.Index(values.cat.categories.astype(str), dtype=object)
+        new = categories[self.ids.get_indexer(categories) < 0]
+        if len(new):
+            self.ids = self.ids.append(new)
+        lookup = self.ids.get_indexer(categories)
+        return lookup[values.cat.codes.to_numpy()]
+
+
+class _Stream:
+    """Time-ordered buffer over one run's chunks"""
+
+    def __init__(self, name: str, source, chunksize: int, codes: _TrainCodes):
+        self.name = name
+        self.chunks = _chunks(source, chunksize)
+        self.codes = codes
+        self.buffer = _empty_rows()
+        self.done = False
+        self.last_time = np.iinfo(np.int64).min
+
+    @property
+    def horizon(self) -> int:
+        """Rows strictly before this time are complete"""
+        if self.done:
+            return _END
+        if not len(self.buffer['time']):
+            return self.last_time
+        return int(self.buffer['time'][-1])
+
+    def read(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            return
+        line = chunk['line'].astype(LINE_DTYPE).cat.codes.to_numpy()
+        event = chunk['event'].astype(EVENT_DTYPE).cat.codes.to_numpy()
+        if (line < 0).any() or (event < 0).any():
+            raise ValueError(f"{self.name}: unknown line or event values")
+        arrays = {
+            'time': pd.to_datetime(chunk['timestamp']).to_numpy(dtype='datetime64[ns]').astype(np.int64),
+            'train': self.codes.encode(chunk['train_id']),
+            'line': line.astype(np.int64),
+            'event': event.astype(np.int64),
+            'delay': chunk['delay_minutes'].to_numpy(dtype=np.float64),
+            'speed': chunk['speed_kmph'].to_numpy(dtype=np.float64),
+            'position': chunk['position_m'].to_numpy(dtype=np.float64),
+        }
+        time = arrays['time']
+        if len(time) and (time[0] < self.last_time or (np.diff(time) < 0).any()):
+            raise ValueError(f"{self.name} is not in timestamp order")
+        if len(time):
+            self.last_time = int(time[-1])
+        self.buffer = {key: np.concatenate([self.buffer[key], values]) for key, values in arrays.items()}
+
+    def take(self, cutoff: int) -> Dict[str, np.ndarray]:
+        """Remove and return the buffered rows before cutoff"""
+        split = len(self.buffer['time']) if cutoff == _END else int(np.searchsorted(self.buffer['time'], cutoff))
+        taken = {key: values[:split] for key, values in self.buffer.items()}
+        self.buffer = {key: values[split:] for key, values in self.buffer.items()}
+        return taken
+
+
+def _headway_pairs(rows: Dict[str, np.ndarray], headway: float) -> np.ndarray:
+    """Line code of each adjacent same-time, same-line pair closer than the headway"""
+    order = np.lexsort((rows['position'], rows['line'], rows['time']))
+    time, line, position = rows['time'][order], rows['line'][order], rows['position'][order]
+    close = (time[1:] == time[:-1]) & (line[1:] == line[:-1]) & (np.diff(position) < headway)
+    return line[1:][close]
+
+
+def _unique_keys(key: np.ndarray):
+    """Sorted keys and the row of each key's first occurrence"""
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_key[1:] != sorted_key[:-1]
+    return sorted_key[first], order[first]
+
+
+class _Accumulator:
+    def __init__(self):
+        n_lines, n_events = len(LINES), len(EVENTS)
+        self.trains = {name: np.zeros(0) for name in (
+            'matched', 'delay_before', 'delay_after', 'speed_before', 'speed_after', 'line_changes', 'event_changes')}
+        self.lines = {f'{stat}_{side}': np.zeros(n_lines) for side in _SIDES
+                      for stat in ('rows', 'delay', 'speed', 'conflicts')}
+        self.line_transitions = np.zeros(n_lines * n_lines, dtype=np.int64)
+        self.event_transitions = np.zeros(n_events * n_events, dtype=np.int64)
+        self.unmatched = {side: 0 for side in _SIDES}
+
+    def _add_trains(self, name: str, codes: np.ndarray, weights: Optional[np.ndarray] = None):
+        counts = np.bincount(codes, weights=weights)
+        current = self.trains[name]
+        if len(counts) > len(current):
+            current = np.concatenate([current, np.zeros(len(counts) - len(current))])
+        current[:len(counts)] += counts
+        self.trains[name] = current
+
+    def add(self, before: Dict[str, np.ndarray], after: Dict[str, np.ndarray], headway: float):
+        n_lines = len(LINES)
+        for side, rows in zip(_SIDES, (before, after)):
+            self.lines[f'rows_{side}'] += np.bincount(rows['line'], minlength=n_lines)
+            self.lines[f'delay_{side}'] += np.bincount(rows['line'], weights=rows['delay'], minlength=n_lines)
+            self.lines[f'speed_{side}'] += np.bincount(rows['line'], weights=rows['speed'], minlength=n_lines)
+            self.lines[f'conflicts_{side}'] += np.bincount(_headway_pairs(rows, headway), minlength=n_lines)
+
+        # Merge-join on (train, time) keys over the chunk's combined time axis
+        times, inverse = np.unique(np.concatenate([before['time'], after['time']]), return_inverse=True)
+        rank_before, rank_after = inverse[:len(before['time'])], inverse[len(before['time']):]
+        keys_before, rows_before = _unique_keys(before['train'] * len(times) + rank_before)
+        keys_after, rows_after = _unique_keys(after['train'] * len(times) + rank_after)
+        slot = np.searchsorted(keys_after, keys_before)
+        hit = slot < len(keys_after)
+        hit[hit] = keys_after[slot[hit]] == keys_before[hit]
+        b, a = rows_before[hit], rows_after[slot[hit]]
+        self.unmatched['before'] += len(keys_before) - len(b)
+        self.unmatched['after'] += len(keys_after) - len(b)
+
+        train = before['train'][b]
+        self._add_trains('matched', train)
+        for field in ('delay', 'speed'):
+            self._add_trains(f'{field}_before', train, before[field][b])
+            self._add_trains(f'{field}_after', train, after[field][a])
+        self._add_trains('line_changes', train, (before['line'][b] != after['line'][a]).astype(np.float64))
+        self._add_trains('event_changes', train, (before['event'][b] != after['event'][a]).astype(np.float64))
+        self.line_transitions += np.bincount(before['line'][b] * n_lines + after['line'][a],
+                                             minlength=n_lines * n_lines)
+        self.event_transitions += np.bincount(before['event'][b] * len(EVENTS) + after['event'][a],
+                                              minlength=len(EVENTS) ** 2)
+
+
+def diff_runs(before, after, headway_minimum: float = 500.0,
+              chunksize: int = DEFAULT_CHUNKSIZE) -> Dict:
+    """Align two runs on (train_id, timestamp) and tabulate what changed.
+
+    before/after are CSV paths (read in timestamp order, chunk by chunk) or
+    frames. Returns 'trains', 'lines', 'line_transitions' and
+    'event_transitions' frames plus a 'summary' dict.
+    """
+    codes = _TrainCodes()
+    streams = [_Stream('before', before, chunksize, codes), _Stream('after', after, chunksize, codes)]
+    totals = _Accumulator()
+
+    while True:
+        pending = [stream for stream in streams if not stream.done]
+        if pending:
+            # Advance the stream that is furthest behind in time
+            min(pending, key=lambda stream: stream.horizon).read()
+        cutoff = min(stream.horizon for stream in streams)
+        totals.add(streams[0].take(cutoff), streams[1].take(cutoff), headway_minimum)
+        if not pending:
+            break
+
+    n_trains = len(codes.ids)
+    per_train = {name: np.pad(values, (0, n_trains - len(values))) for name, values in totals.trains.items()}
+    matched = per_train['matched']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trains = pd.DataFrame({
+            'train_id': codes.ids.to_numpy(),
+            'matched_records': matched.astype(np.int64),
+            'mean_delay_before': per_train['delay_before'] / matched,
+            'mean_delay_after': per_train['delay_after'] / matched,
+            'mean_speed_before': per_train['speed_before'] / matched,
+            'mean_speed_after': per_train['speed_after'] / matched,
+            'line_changes': per_train['line_changes'].astype(np.int64),
+            'event_changes': per_train['event_changes'].astype(np.int64),
+        })
+        trains['delay_delta'] = trains['mean_delay_after'] - trains['mean_delay_before']
+        trains['speed_delta'] = trains['mean_speed_after'] - trains['mean_speed_before']
+
+        stats = totals.lines
+        lines = pd.DataFrame({'line': [line.value for line in LINES]})
+        for side in _SIDES:
+            lines[f'records_{side}'] = stats[f'rows_{side}'].astype(np.int64)
+            lines[f'mean_delay_{side}'] = stats[f'delay_{side}'] / stats[f'rows_{side}']
+            lines[f'mean_speed_{side}'] = stats[f'speed_{side}'] / stats[f'rows_{side}']
+            lines[f'headway_conflicts_{side}'] = stats[f'conflicts_{side}'].astype(np.int64)
+        lines['delay_delta'] = lines['mean_delay_after'] - lines['mean_delay_before']
+        lines['speed_delta'] = lines['mean_speed_after'] - lines['mean_speed_before']
+
+    line_names = [line.value for line in LINES]
+    event_names = [event.value for event in EVENTS]
+    line_transitions = pd.DataFrame(totals.line_transitions.reshape(len(LINES), len(LINES)),
+                                    index=pd.Index(line_names, name='before'), columns=pd.Index(line_names, name='after'))
+    event_transitions = pd.DataFrame(totals.event_transitions.reshape(len(EVENTS), len(EVENTS)),
+                                     index=pd.Index(event_names, name='before'), columns=pd.Index(event_names, name='after'))
+
+    n_matched = int(matched.sum())
+    compared = trains[trains['matched_records'] > 0]
+
+    def matched_mean(name):
+        return float(per_train[name].sum() / n_matched) if n_matched else 0.0
+
+    summary = {
+        'matched_records': n_matched,
+        'before_only_records': totals.unmatched['before'],
+        'after_only_records': totals.unmatched['after'],
+        'trains_compared': len(compared),
+        'mean_delay_before': matched_mean('delay_before'),
+        'mean_delay_after': matched_mean('delay_after'),
+        'mean_speed_before': matched_mean('speed_before'),
+        'mean_speed_after': matched_mean('speed_after'),
+        'trains_delay_improved': int((compared['delay_delta'] < 0).sum()),
+        'trains_delay_worsened': int((compared['delay_delta'] > 0).sum()),
+        'line_changes': int(per_train['line_changes'].sum()),
+        'event_changes': int(per_train['event_changes'].sum()),
+        'headway_conflicts_before': int(lines['headway_conflicts_before'].sum()),
+        'headway_conflicts_after': int(lines['headway_conflicts_after'].sum()),
+    }
+    summary['mean_delay_delta'] = summary['mean_delay_after'] - summary['mean_delay_before']
+    summary['mean_speed_delta'] = summary['mean_speed_after'] - summary['mean_speed_before']
+
+    return {
+        'summary': summary,
+        'trains': trains,
+        'lines': lines,
+        'line_transitions': line_transitions,
+        'event_transitions': event_transitions,
+    }
+
+
+def print_diff(diff: Dict):
+    summary = diff['summary']
+    print(f" Compared {summary['trains_compared']} trains on {summary['matched_records']} matched records "
+          f"({summary['before_only_records']} before-only, {summary['after_only_records']} after-only)")
+    print(f"  Mean delay: {summary['mean_delay_before']:.2f} -> {summary['mean_delay_after']:.2f} min "
+          f"({summary['trains_delay_improved']} trains improved, {summary['trains_delay_worsened']} worsened)")
+    print(f"  Mean speed: {summary['mean_speed_before']:.1f} -> {summary['mean_speed_after']:.1f} km/h")
+    print(f"  Line changes: {summary['line_changes']}, event changes: {summary['event_changes']}")
+    print(f"  Headway conflicts: {summary['headway_conflicts_before']} -> {summary['headway_conflicts_after']}")
+
+    print("\n  PER LINE")
+    print(diff['lines'].to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    print("\n  LINE TRANSITIONS (rows: before, columns: after)")
+    print(diff['line_transitions'].to_string())
+
+
+def save_diff_tables(diff: Dict, output_dir: str):
+    """Write the per-train/per-line tables and transition matrices as CSV"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in ('trains', 'lines'):
+        diff[name].to_csv(os.path.join(output_dir, f'diff_{name}.csv'), index=False)
+    for name in ('line_transitions', 'event_transitions'):
+        diff[name].to_csv(os.path.join(output_dir, f'diff_{name}.csv'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a simulation input with an optimized output per train")
+    parser.add_argument('before', nargs='?', default="train_simulation_output_before.csv")
+    parser.add_argument('after', nargs='?', default="train_simulation_output_after.csv")
+    parser.add_argument('--headway', type=float, default=500.0, help="headway minimum (m)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="rows read per chunk")
+    parser.add_argument('--output-dir', default=None, help="write the per-train/per-line tables here")
+    args = parser.parse_args()
+
+    diff = diff_runs(args.before, args.after, args.headway, args.chunksize)
+    print_diff(diff)
+    if args.output_dir:
+        save_diff_tables(diff, args.output_dir)
+        print(f"\n Saved comparison tables to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
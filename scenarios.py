@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+What-If Scenario Runner
+=======================
+
+Compares optimizer parameter sets on the same input:
+- headway_minimum, max_disruption_ratio, active_train_ratio, spacing_step
+- The input is parsed once and published to worker processes through
+  shared memory as dictionary-encoded columns, so workers never re-read
+  or re-pickle the frame
+- Each scenario runs optimize_schedule in a process pool with the same
+  random seed, so differences come from the parameters, not the draws
+- Returns one row of headline report KPIs per scenario, plus the spacing
+  resolver outcome (trains moved, total shift, residual violations)
+"""
+
+import argparse
+import itertools
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from main import RailwayOptimizer
+from encoding import CSV_DTYPES, COLUMN_LAYOUT, frame_to_columns, columns_to_frame
+
+OPTIMIZER_PARAMETERS = ('headway_minimum', 'max_disruption_ratio', 'active_train_ratio', 'spacing_step')
+
+KPI_COLUMNS = ['efficiency_score', 'on_time_percentage', 'delayed_percentage', 'halted_percentage',
+               'rerouted_percentage', 'average_delay_minutes', 'average_speed_kmph', 'conflicts_detected']
+
+SPACING_COLUMNS = ['trains_moved', 'total_shift_m', 'residual_conflicts']
+
+# Per-worker state set up by _attach_worker
+_worker_frame: Optional[pd.DataFrame] = None
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+
+
+def parameter_grid(**values: List) -> List[Dict]:
+    """Cartesian product of parameter values, e.g. parameter_grid(headway_minimum=[400, 500])"""
+    unknown = set(values) - set(OPTIMIZER_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown optimizer parameters: {sorted(unknown)}")
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+class SharedFrame:
+    """A simulation frame published once to shared memory as encoded columns"""
+
+    def __init__(self, df: pd.DataFrame):
+        columns, categories = frame_to_columns(df)
+
+        self.rows = len(df)
+        size = max(1, sum(np.dtype(dtype).itemsize * self.rows for _, dtype in COLUMN_LAYOUT))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        offset = 0
+        for name, dtype in COLUMN_LAYOUT:
+            view = np.ndarray(self.rows, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            view[:] = columns[name]
+            offset += view.nbytes
+
+        self.spec = {'name': self.shm.name, 'rows': self.rows, 'categories': categories}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    @staticmethod
+    def attach(spec: Dict) -> Tuple[shared_memory.SharedMemory, pd.DataFrame]:
+        """Rebuild the frame in a worker from the shared block"""
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        rows = spec['rows']
+        columns = {}
+        offset = 0
+        for name, dtype in COLUMN_LAYOUT:
+            columns[name] = np.ndarray(rows, dtype=dtype, buffer=shm.buf, offset=offset)
+            offset += columns[name].nbytes
+
+        return shm, columns_to_frame(columns, spec['categories'])
+
+
+def _attach_worker(spec: Dict):
+    global _worker_shm, _worker_frame
+    _worker_shm, _worker_frame = SharedFrame.attach(spec)
+
+
+def _run_scenario(job: Tuple[int, Dict, int]) -> Dict:
+    """Run one scenario against the worker's shared frame"""
+    scenario_id, parameters, seed = job
+    started = time.perf_counter()
+
+    random.seed(seed)
+    optimizer = RailwayOptimizer()
+    for name, value in parameters.items():
+        setattr(optimizer, name, value)
+    optimizer.load_simulation_frame(_worker_frame.copy())
+    optimizer.optimize_schedule()
+    report = optimizer.generate_optimization_report()
+
+    row = {'scenario': scenario_id, **parameters}
+    row.update({kpi: report[kpi] for kpi in KPI_COLUMNS})
+    # Spacing outcome, where spacing_step shows up (the KPIs above do not depend on positions)
+    spacing = report.get('spacing', {})
+    row.update({f'spacing_{name}': spacing.get(name) for name in SPACING_COLUMNS})
+    row['runtime_seconds'] = time.perf_counter() - started
+    return row
+
+
+def run_scenarios(source, scenarios: List[Dict], max_workers: Optional[int] = None,
+                  seed: int = 0) -> pd.DataFrame:
+    """Run optimize_schedule once per parameter set and tabulate the report KPIs.
+
+    source is a CSV path or an already loaded simulation frame.
+    """
+    for parameters in scenarios:
+        unknown = set(parameters) - set(OPTIMIZER_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown optimizer parameters: {sorted(unknown)}")
+
+    df = pd.read_csv(source, dtype=CSV_DTYPES) if isinstance(source, str) else source
+    shared = SharedFrame(df)
+    try:
+        jobs = [(i, parameters, seed) for i, parameters in enumerate(scenarios)]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_worker,
+                                 initargs=(shared.spec,)) as pool:
+            rows = list(pool.map(_run_scenario, jobs))
+    finally:
+        shared.close()
+
+    return pd.DataFrame(rows).set_index('scenario')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare optimizer parameter sets on one input")
+    parser.add_argument('input', help="simulation CSV")
+    parser.add_argument('--headway', type=float, nargs='+', default=[500.0], help="headway_minimum values (m)")
+    parser.add_argument('--disruption-cap', type=float, nargs='+', default=[0.05], help="max_disruption_ratio values")
+    parser.add_argument('--active-ratio', type=float, nargs='+', default=[0.5], help="active_train_ratio values")
+    parser.add_argument('--spacing-step', type=float, nargs='+', default=[600.0], help="spacing_step values (m)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="write the comparison table to this CSV")
+    args = parser.parse_args()
+
+    scenarios = parameter_grid(
+        headway_minimum=args.headway,
+        max_disruption_ratio=args.disruption_cap,
+        active_train_ratio=args.active_ratio,
+        spacing_step=args.spacing_step
+    )
+    print(f" Running {len(scenarios)} scenarios...")
+    started = time.perf_counter()
+    table = run_scenarios(args.input, scenarios, max_workers=args.workers, seed=args.seed)
+    print(f" Completed in {time.perf_counter() - started:.1f}s\n")
+    print(table.to_string(float_format=lambda value: f"{value:.2f}"))
+
+    if args.output:
+        table.to_csv(args.output)
+        print(f"\n Saved comparison table to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from main import RailwayOptimizer
+from time_space import TimeSpaceIndex, conflict_markers
+from throughput import compute_throughput, throughput_summary
+from run_diff import diff_runs
+from encoding import concat_encoded
+from trajectory_archive import TrajectoryArchive
 
 # Page configuration
 st.set_page_config(
@@ -233,14 +238,79 @@ st.markdown(f"""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(ttl=3600)
+def load_archive(csv_path, mtime):
+    """Memory-mapped archive of the input, rebuilt when the CSV changes; shared by all sessions"""
+    return TrajectoryArchive.for_csv(csv_path)
+
 @st.cache_data(ttl=3600)
 def load_and_optimize(csv_path):
     """Load data and run optimization"""
     optimizer = RailwayOptimizer()
-    df_input = optimizer.load_simulation_data(csv_path)
+    df_input = optimizer.load_simulation_data(csv_path, use_cache=True)
     df_optimized = optimizer.optimize_schedule()
     report = optimizer.generate_optimization_report()
-    return df_input, df_optimized, report
+    return df_input, df_optimized, report, optimizer.conflicts
+
+@st.cache_resource(ttl=3600)
+def load_and_optimize_window(csv_path, mtime, window):
+    """Optimize window=(start, end) of the input's archive
+
+    Cached as a resource so the window's columns stay views of the mapped
+    archive instead of being pickled and copied per session like
+    st.cache_data results; the returned objects are shared and read-only.
+    """
+    optimizer = RailwayOptimizer()
+    df_input = optimizer.load_simulation_archive(load_archive(csv_path, mtime), *window)
+    df_optimized = optimizer.optimize_schedule()
+    report = optimizer.generate_optimization_report()
+    return df_input, df_optimized, report, optimizer.conflicts
+
+def load_incremental(csv_path):
+    """Keep one optimizer per session and feed it only rows appended since the last poll"""
+    source = Path(csv_path).stat()
+    state = st.session_state.get('incremental')
+    
+    if (state is None or state['csv_path'] != csv_path
+            or source.st_size < state['optimizer'].source_offset):
+        optimizer = RailwayOptimizer()
+        df_input = optimizer.load_simulation_data(csv_path, use_cache=True)
+        df_optimized = optimizer.optimize_schedule()
+        state = {'csv_path': csv_path, 'optimizer': optimizer, 'mtime': source.st_mtime,
+                 'df_input': df_input, 'df_optimized': df_optimized}
+        st.session_state['incremental'] = state
+    elif source.st_mtime != state['mtime']:
+        optimizer = state['optimizer']
+        df_new, new_train_ids = optimizer.ingest_appended_data()
+        if len(df_new) > 0:
+            state['df_input'] = concat_encoded([state['df_input'], df_new])
+            state['df_optimized'] = optimizer.optimize_incremental(new_train_ids)
+        state['mtime'] = source.st_mtime
+    
+    optimizer = state['optimizer']
+    report = optimizer.generate_optimization_report()
+    return state['df_input'], state['df_optimized'], report, optimizer.conflicts
+
+def poll_input(csv_path):
+    """Re-run the app once the input file's mtime moves past what load_incremental has seen"""
+    state = st.session_state.get('incremental')
+    if state is not None and state['csv_path'] == csv_path and Path(csv_path).stat().st_mtime != state['mtime']:
+        st.rerun()
+
+@st.cache_resource(ttl=3600)
+def load_time_space_index(data_key, n_records, _df_input):
+    """Build the decimation index for the time-space diagram once per input (file and window) and size"""
+    return TimeSpaceIndex.from_frame(_df_input)
+
+@st.cache_data(ttl=3600)
+def load_throughput(data_key, n_records, bin_minutes, _df_input):
+    """Section throughput and occupancy metrics for the input time series"""
+    return compute_throughput(_df_input, bin_minutes=bin_minutes)
+
+@st.cache_data(ttl=3600)
+def load_run_diff(data_key, n_records, _df_input, _df_optimized):
+    """Per-train and per-line comparison of the input with the optimized output"""
+    return diff_runs(_df_input, _df_optimized)
 
 def main():
     st.markdown('<h1 class="main-header">Railway Section Throughput Optimizer</h1>', unsafe_allow_html=True)
@@ -276,13 +346,33 @@ def main():
         
         st.divider()
         st.header("Settings")
-        auto_refresh = st.checkbox("Auto-refresh on data change", value=True)
+        use_archive = st.checkbox("Use memory-mapped archive", value=False,
+                                  help="Slice a time window from a binary archive of the CSV instead of parsing it")
+        # An archive window is a fixed snapshot, so it replaces incremental auto-refresh
+        auto_refresh = st.checkbox("Auto-refresh on data change", value=True, disabled=use_archive) and not use_archive
+        poll_seconds = st.number_input("Poll interval (s)", min_value=1, max_value=600, value=5, disabled=not auto_refresh)
+        window = None
+        if use_archive:
+            archive = load_archive(csv_path, Path(csv_path).stat().st_mtime)
+            first, last = archive.time_range
+            if first is not None and first < last:
+                start, end = st.slider("Time window", min_value=first.to_pydatetime(), max_value=last.to_pydatetime(),
+                                       value=(first.to_pydatetime(), last.to_pydatetime()), format="HH:mm")
+                # end is inclusive in the slider, exclusive in the archive
+                window = (pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(1, 'ns'))
     
     # Main content
     if csv_path:
         try:
             with st.spinner("Loading and optimizing data..."):
-                df_input, df_optimized, report = load_and_optimize(csv_path)
+                if auto_refresh:
+                    df_input, df_optimized, report, conflicts = load_incremental(csv_path)
+                elif window is not None:
+                    df_input, df_optimized, report, conflicts = load_and_optimize_window(
+                        csv_path, Path(csv_path).stat().st_mtime, window)
+                else:
+                    df_input, df_optimized, report, conflicts = load_and_optimize(csv_path)
+            data_key = csv_path if window is None else f"{csv_path}@{window[0]}/{window[1]}"
             
             # Key Metrics Row
             st.markdown('<div class="section-header">Key Performance Indicators</div>', unsafe_allow_html=True)
@@ -335,9 +425,9 @@ def main():
             st.divider()
             
             # Tabs for different views
-            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+            tab1, tab2, tab3, tab4, tab5, tab_time_space, tab_throughput, tab_diff, tab6 = st.tabs([
                 "Overview", "Train Types", "Stations", 
-                "Lines", "Speed Analysis", "Raw Data"
+                "Lines", "Speed Analysis", "Time-Space", "Throughput", "Before/After", "Raw Data"
             ])
             
             with tab1:
@@ -424,6 +514,7 @@ def main():
                     st.markdown('<div class="sub-header">Train Event Status Distribution</div>', unsafe_allow_html=True)
                     if 'event' in df_optimized.columns and len(df_optimized) > 0:
                         event_counts = df_optimized['event'].value_counts()
+                        event_counts = event_counts[event_counts > 0]
                         event_df = pd.DataFrame({
                             'Event': event_counts.index,
                             'Count': event_counts.values,
@@ -1115,7 +1206,7 @@ def main():
                 
                 with col2:
                     st.markdown('<div class="sub-header">Average Speed by Train Type</div>', unsafe_allow_html=True)
-                    speed_by_type = df_optimized[df_optimized['speed_kmph'] > 0].groupby('train_type')['speed_kmph'].agg(['mean', 'std', 'count']).reset_index()
+                    speed_by_type = df_optimized[df_optimized['speed_kmph'] > 0].groupby('train_type', observed=True)['speed_kmph'].agg(['mean', 'std', 'count']).reset_index()
                     speed_by_type.columns = ['Train Type', 'Avg Speed', 'Std Dev', 'Count']
                     speed_by_type = speed_by_type.sort_values('Avg Speed', ascending=False)
                     
@@ -1194,6 +1285,235 @@ def main():
                 )
                 st.plotly_chart(fig_speed_delay, use_container_width=True)
             
+            with tab_time_space:
+                st.markdown('<div class="section-header">Time-Space Diagram</div>', unsafe_allow_html=True)
+                
+                ts_index = load_time_space_index(data_key, len(df_input), df_input)
+                window_start, window_end = ts_index.time_range
+                if window_start is None:
+                    st.info("No records to draw in the time-space diagram.")
+                else:
+                    col1, col2, col3 = st.columns([3, 1, 2])
+                    with col1:
+                        zoom_window = st.slider(
+                            "Time window",
+                            min_value=window_start.to_pydatetime(),
+                            max_value=window_end.to_pydatetime(),
+                            value=(window_start.to_pydatetime(), window_end.to_pydatetime()),
+                            format="HH:mm"
+                        )
+                    with col2:
+                        max_points = st.number_input("Max points", min_value=500, max_value=50000, value=5000, step=500)
+                    with col3:
+                        all_types = sorted(set(ts_index.train_types))
+                        selected_types = st.multiselect("Train types", all_types, default=all_types)
+                
+                    rows, tolerance = ts_index.select(zoom_window[0], zoom_window[1], int(max_points), selected_types)
+                    st.caption(f"Showing {len(rows):,} of {len(ts_index.times):,} points (max position error {tolerance:.0f} m)")
+                
+                    fig_marey = go.Figure()
+                    for train_type, trace in ts_index.polylines(rows).items():
+                        fig_marey.add_trace(go.Scattergl(
+                            x=trace['x'],
+                            y=trace['y'],
+                            text=trace['text'],
+                            mode='lines',
+                            name=train_type,
+                            line=dict(width=1),
+                            hovertemplate='%{text}<br>%{x}<br>%{y:.0f} m<extra></extra>'
+                        ))
+                
+                    markers = conflict_markers(conflicts)
+                    if len(markers) > 0:
+                        in_window = (markers['timestamp'] >= zoom_window[0]) & (markers['timestamp'] <= zoom_window[1])
+                        markers = markers[in_window]
+                        fig_marey.add_trace(go.Scattergl(
+                            x=markers['timestamp'],
+                            y=markers['position_m'],
+                            mode='markers',
+                            name='Headway violation',
+                            marker=dict(symbol='x', size=9, color=COLORS['danger']),
+                            text=markers['trains'] + ' (' + markers['line'] + ', ' + markers['distance'].round(0).astype(str) + ' m)',
+                            hovertemplate='%{text}<extra></extra>'
+                        ))
+                
+                    fig_marey.update_layout(
+                        xaxis_title="Time",
+                        yaxis_title="Position (m)",
+                        plot_bgcolor=COLORS['card_bg'],
+                        paper_bgcolor=COLORS['bg_dark'],
+                        font=dict(family='Inter', size=11, color=COLORS['text']),
+                        height=600,
+                        legend=dict(font=dict(color=COLORS['text']))
+                    )
+                    fig_marey.update_xaxes(
+                        gridcolor=COLORS['border'],
+                        tickfont=dict(color=COLORS['text']),
+                        title=dict(font=dict(color=COLORS['text']))
+                    )
+                    fig_marey.update_yaxes(
+                        gridcolor=COLORS['border'],
+                        tickfont=dict(color=COLORS['text']),
+                        title=dict(font=dict(color=COLORS['text']))
+                    )
+                    st.plotly_chart(fig_marey, use_container_width=True)
+            
+            with tab_throughput:
+                st.markdown('<div class="section-header">Section Throughput</div>', unsafe_allow_html=True)
+                
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    bin_minutes = st.selectbox("Time bin", [15, 30, 60], index=2, format_func=lambda m: f"{m} min")
+                metrics = load_throughput(data_key, len(df_input), bin_minutes, df_input)
+                with col2:
+                    all_lines = sorted(metrics['occupancy']['line'].unique())
+                    selected_lines = st.multiselect("Lines", all_lines, default=all_lines)
+                
+                summary = throughput_summary(metrics)
+                busiest = max(summary['blocks'].items(), key=lambda item: item[1]['occupancy_ratio'])
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Peak Throughput", f"{summary['peak_trains_per_hour']:.0f} trains/h")
+                with col2:
+                    st.metric("Completed Block Traversals", summary['completed_traversals'])
+                with col3:
+                    st.metric("Most Occupied Block", busiest[0], delta=f"{busiest[1]['occupancy_ratio'] * 100:.0f}% occupied",
+                              delta_color="off")
+                
+                throughput = metrics['throughput'][metrics['throughput']['line'].isin(selected_lines)]
+                occupancy = metrics['occupancy'][metrics['occupancy']['line'].isin(selected_lines)]
+                running_time = metrics['running_time'][metrics['running_time']['line'].isin(selected_lines)]
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown('<div class="sub-header">Trains per Hour by Block</div>', unsafe_allow_html=True)
+                    per_block = throughput.groupby(['bin_start', 'block'], observed=True)['trains_per_hour'].sum().reset_index()
+                    fig_throughput = px.line(
+                        per_block, x='bin_start', y='trains_per_hour', color='block', markers=True,
+                        labels={'bin_start': 'Time', 'trains_per_hour': 'Trains/hour', 'block': 'Block'}
+                    )
+                    fig_throughput.update_layout(
+                        plot_bgcolor=COLORS['card_bg'],
+                        paper_bgcolor=COLORS['bg_dark'],
+                        font=dict(family='Inter', size=11, color=COLORS['text']),
+                        height=400,
+                        legend=dict(font=dict(color=COLORS['text']))
+                    )
+                    fig_throughput.update_xaxes(gridcolor=COLORS['border'], tickfont=dict(color=COLORS['text']))
+                    fig_throughput.update_yaxes(gridcolor=COLORS['border'], tickfont=dict(color=COLORS['text']))
+                    st.plotly_chart(fig_throughput, use_container_width=True)
+                
+                with col2:
+                    st.markdown('<div class="sub-header">Mean Running Time by Block</div>', unsafe_allow_html=True)
+                    fig_running = px.bar(
+                        running_time, x='block', y='mean_running_time_minutes', color='line', barmode='group',
+                        labels={'block': 'Block', 'mean_running_time_minutes': 'Minutes', 'line': 'Line'}
+                    )
+                    fig_running.update_layout(
+                        plot_bgcolor=COLORS['card_bg'],
+                        paper_bgcolor=COLORS['bg_dark'],
+                        font=dict(family='Inter', size=11, color=COLORS['text']),
+                        height=400,
+                        legend=dict(font=dict(color=COLORS['text']))
+                    )
+                    fig_running.update_xaxes(gridcolor=COLORS['border'], tickfont=dict(color=COLORS['text']))
+                    fig_running.update_yaxes(gridcolor=COLORS['border'], tickfont=dict(color=COLORS['text']))
+                    st.plotly_chart(fig_running, use_container_width=True)
+                
+                st.markdown('<div class="sub-header">Block Occupancy</div>', unsafe_allow_html=True)
+                occupancy_grid = occupancy.pivot_table(index='block', columns='bin_start', values='occupancy_ratio',
+                                                       aggfunc='mean', observed=False).fillna(0)
+                fig_occupancy = go.Figure(go.Heatmap(
+                    z=occupancy_grid.values * 100,
+                    x=occupancy_grid.columns,
+                    y=occupancy_grid.index.astype(str),
+                    colorscale='Reds',
+                    zmin=0,
+                    zmax=100,
+                    colorbar=dict(title=dict(text='% occupied', font=dict(color=COLORS['text'])),
+                                  tickfont=dict(color=COLORS['text'])),
+                    hovertemplate='%{y}<br>%{x}<br>%{z:.0f}% occupied<extra></extra>'
+                ))
+                fig_occupancy.update_layout(
+                    plot_bgcolor=COLORS['card_bg'],
+                    paper_bgcolor=COLORS['bg_dark'],
+                    font=dict(family='Inter', size=11, color=COLORS['text']),
+                    height=400
+                )
+                fig_occupancy.update_xaxes(tickfont=dict(color=COLORS['text']))
+                fig_occupancy.update_yaxes(tickfont=dict(color=COLORS['text']))
+                st.plotly_chart(fig_occupancy, use_container_width=True)
+            
+            with tab_diff:
+                st.markdown('<div class="section-header">Before/After Comparison</div>', unsafe_allow_html=True)
+                
+                diff = load_run_diff(data_key, len(df_input), df_input, df_optimized)
+                summary = diff['summary']
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Matched Records", summary['matched_records'],
+                              delta=f"{summary['trains_compared']} trains", delta_color="off")
+                with col2:
+                    st.metric("Mean Delay", f"{summary['mean_delay_after']:.2f} min",
+                              delta=f"{summary['mean_delay_delta']:+.2f} min", delta_color="inverse")
+                with col3:
+                    st.metric("Mean Speed", f"{summary['mean_speed_after']:.1f} km/h",
+                              delta=f"{summary['mean_speed_delta']:+.1f} km/h")
+                with col4:
+                    st.metric("Headway Conflicts", summary['headway_conflicts_after'],
+                              delta=summary['headway_conflicts_after'] - summary['headway_conflicts_before'],
+                              delta_color="inverse")
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown('<div class="sub-header">Mean Delay by Line</div>', unsafe_allow_html=True)
+                    line_delays = diff['lines'].melt(id_vars='line', value_vars=['mean_delay_before', 'mean_delay_after'],
+                                                     var_name='run', value_name='delay')
+                    line_delays['run'] = line_delays['run'].map({'mean_delay_before': 'Before', 'mean_delay_after': 'After'})
+                    fig_line_delay = px.bar(
+                        line_delays, x='line', y='delay', color='run', barmode='group',
+                        color_discrete_map={'Before': COLORS['text_light'], 'After': COLORS['accent']},
+                        labels={'line': 'Line', 'delay': 'Minutes', 'run': 'Run'}
+                    )
+                    fig_line_delay.update_layout(
+                        plot_bgcolor=COLORS['card_bg'],
+                        paper_bgcolor=COLORS['bg_dark'],
+                        font=dict(family='Inter', size=11, color=COLORS['text']),
+                        height=400,
+                        legend=dict(font=dict(color=COLORS['text']))
+                    )
+                    fig_line_delay.update_xaxes(gridcolor=COLORS['border'], tickfont=dict(color=COLORS['text']))
+                    fig_line_delay.update_yaxes(gridcolor=COLORS['border'], tickfont=dict(color=COLORS['text']))
+                    st.plotly_chart(fig_line_delay, use_container_width=True)
+                
+                with col2:
+                    st.markdown('<div class="sub-header">Line Transitions</div>', unsafe_allow_html=True)
+                    transitions = diff['line_transitions']
+                    fig_transitions = go.Figure(go.Heatmap(
+                        z=transitions.values,
+                        x=transitions.columns,
+                        y=transitions.index,
+                        colorscale='Blues',
+                        colorbar=dict(title=dict(text='records', font=dict(color=COLORS['text'])),
+                                      tickfont=dict(color=COLORS['text'])),
+                        hovertemplate='%{y} -> %{x}<br>%{z} records<extra></extra>'
+                    ))
+                    fig_transitions.update_layout(
+                        plot_bgcolor=COLORS['card_bg'],
+                        paper_bgcolor=COLORS['bg_dark'],
+                        font=dict(family='Inter', size=11, color=COLORS['text']),
+                        height=400,
+                        xaxis_title="After",
+                        yaxis_title="Before"
+                    )
+                    fig_transitions.update_xaxes(tickfont=dict(color=COLORS['text']))
+                    fig_transitions.update_yaxes(tickfont=dict(color=COLORS['text']))
+                    st.plotly_chart(fig_transitions, use_container_width=True)
+                
+                st.markdown('<div class="sub-header">Per-Train Changes</div>', unsafe_allow_html=True)
+                compared = diff['trains'][diff['trains']['matched_records'] > 0]
+                st.dataframe(compared.sort_values('delay_delta'), use_container_width=True, hide_index=True, height=400)
+            
             with tab6:
                 st.markdown('<div class="section-header">Raw Data View</div>', unsafe_allow_html=True)
                 
@@ -1241,13 +1561,18 @@ def main():
             st.markdown(f"""
             <div style='text-align: center; color: {COLORS['text_light']}; padding: 20px; font-family: Inter, sans-serif;'>
                 <p style='margin: 0; font-weight: 500;'>Railway Section Throughput Optimizer Dashboard</p>
-                <p style='margin: 5px 0 0 0; font-size: 0.9rem;'>Optimized for Mumbai Central to Thane route</p>
+                <p style='margin: 5px 0 0 0; font-size: 0.9rem;'>Optimized for Mumbai Central to Hoshangabad route</p>
             </div>
             """, unsafe_allow_html=True)
             
         except Exception as e:
             st.error(f"Error processing data: {str(e)}")
             st.exception(e)
+        
+        # Poll the input file's mtime from a fragment timer so the session stays responsive;
+        # appended rows are picked up incrementally on the full rerun it triggers
+        if auto_refresh:
+            st.fragment(run_every=poll_seconds)(poll_input)(csv_path)
 
 if __name__ == "__main__":
     main()
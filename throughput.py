@@ -0,0 +1,212 @@
+"""
+Section Throughput Metrics
+==========================
+
+Throughput and block occupancy from the full simulation time series:
+- The corridor is cut into blocks between consecutive stations of the
+  topology
+- Each train's interpolated trajectory (see interval_headway) is split at
+  the station positions it crosses, giving block entry/exit times
+- A traversal that enters at one station and leaves at the other counts
+  towards throughput and running time
+- Occupancy is the share of each time bin in which at least one train is
+  in the block on that line
+
+Everything is computed on arrays; compute_throughput returns tidy frames
+for charting and throughput_summary condenses them for the report.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from interval_headway import trajectory_segments
+from topology import Topology, load_topology
+
+
+def block_names(topology: Topology):
+    names = [station['name'] for station in topology.stations]
+    return [f"{a} - {b}" for a, b in zip(names, names[1:])]
+
+
+def block_pieces(df: pd.DataFrame, topology: Topology) -> Tuple[pd.DataFrame, pd.Timestamp]:
+    """Split every trajectory segment at the station positions it crosses.
+
+    Times are seconds from the returned origin timestamp.
+    """
+    stations = np.array([station['position'] for station in topology.stations], dtype=np.float64)
+    segments = trajectory_segments(df)
+    origin = segments['start_time'].min()
+    t0 = (segments['start_time'] - origin).dt.total_seconds().to_numpy()
+    t1 = (segments['end_time'] - origin).dt.total_seconds().to_numpy()
+    p0 = segments['start_position'].to_numpy()
+    p1 = segments['end_position'].to_numpy()
+
+    last_block = len(stations) - 2
+    b0 = np.clip(np.searchsorted(stations, p0, side='right') - 1, 0, last_block)
+    b1 = np.clip(np.searchsorted(stations, p1, side='right') - 1, 0, last_block)
+    direction = np.where(b1 >= b0, 1, -1)
+    crossings = np.abs(b1 - b0)
+
+    # Piece k of a segment lies in block b0 + direction * k
+    counts = crossings + 1
+    segment = np.repeat(np.arange(len(t0)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    seg_dir = direction[segment]
+    block = b0[segment] + seg_dir * k
+    last = k == crossings[segment]
+
+    # Forward pieces run from station block to block + 1, backward ones the other way
+    entry_station = np.where(seg_dir > 0, block, block + 1)
+    exit_station = np.where(seg_dir > 0, block + 1, block)
+    start_pos = np.where(k == 0, p0[segment], stations[entry_station])
+    end_pos = np.where(last, p1[segment], stations[exit_station])
+
+    travel = p1[segment] - p0[segment]
+    fraction_start = np.divide(start_pos - p0[segment], travel, out=np.zeros_like(start_pos), where=travel != 0)
+    fraction_end = np.divide(end_pos - p0[segment], travel, out=np.ones_like(end_pos), where=travel != 0)
+    duration = t1[segment] - t0[segment]
+
+    # Starting or stopping exactly on a station (e.g. turning at a terminus) also enters/leaves
+    bounds = (stations[block], stations[block + 1])
+
+    return pd.DataFrame({
+        'train_id': segments['train_id'].to_numpy()[segment],
+        'line': segments['line'].to_numpy()[segment],
+        'block': block,
+        'start': np.where(k == 0, t0[segment], t0[segment] + fraction_start * duration),
+        'end': np.where(last, t1[segment], t0[segment] + fraction_end * duration),
+        'entered_at_station': (start_pos == bounds[0]) | (start_pos == bounds[1]),
+        'left_at_station': (end_pos == bounds[0]) | (end_pos == bounds[1]),
+        'start_position': start_pos,
+        'end_position': end_pos,
+    }), origin
+
+
+def block_traversals(pieces: pd.DataFrame) -> pd.DataFrame:
+    """Merge a train's contiguous pieces in one block into traversals"""
+    pieces = pieces.sort_values(['train_id', 'start'], kind='stable').reset_index(drop=True)
+    continues = ((pieces['train_id'] == pieces['train_id'].shift())
+                 & (pieces['line'] == pieces['line'].shift())
+                 & (pieces['block'] == pieces['block'].shift())
+                 & (pieces['start'] == pieces['end'].shift())
+                 & ~pieces['left_at_station'].shift(fill_value=False))
+    traversal = (~continues).cumsum()
+    grouped = pieces.groupby(traversal, sort=False)
+    traversals = pd.DataFrame({
+        'train_id': grouped['train_id'].first(),
+        'line': grouped['line'].first(),
+        'block': grouped['block'].first(),
+        'start': grouped['start'].first(),
+        'end': grouped['end'].last(),
+        'entered_at_station': grouped['entered_at_station'].first(),
+        'left_at_station': grouped['left_at_station'].last(),
+        'start_position': grouped['start_position'].first(),
+        'end_position': grouped['end_position'].last(),
+    }).reset_index(drop=True)
+    traversals['complete'] = (traversals['entered_at_station'] & traversals['left_at_station']
+                              & (traversals['start_position'] != traversals['end_position']))
+    return traversals
+
+
+def _occupied_intervals(traversals: pd.DataFrame) -> pd.DataFrame:
+    """Union of traversal intervals per (block, line)"""
+    spans = traversals.sort_values(['block', 'line', 'start'], kind='stable').reset_index(drop=True)
+    same = (spans['block'] == spans['block'].shift()) & (spans['line'] == spans['line'].shift())
+    reached = spans.groupby(['block', 'line'], sort=False)['end'].cummax().shift()
+    cluster = (~(same & (spans['start'] <= reached))).cumsum()
+    grouped = spans.groupby(cluster, sort=False)
+    return pd.DataFrame({
+        'block': grouped['block'].first(),
+        'line': grouped['line'].first(),
+        'start': grouped['start'].min(),
+        'end': grouped['end'].max(),
+    }).reset_index(drop=True)
+
+
+def compute_throughput(df: pd.DataFrame, topology: Optional[Topology] = None,
+                       bin_minutes: float = 60.0) -> Dict[str, pd.DataFrame]:
+    """Trains per hour, running times and occupancy per block and line.
+
+    Returns 'traversals' (one row per train per block visit), 'throughput'
+    and 'occupancy' (per time bin, block and line) and 'running_time'
+    (per block and line).
+    """
+    topology = topology or load_topology()
+    names = block_names(topology)
+    pieces, origin = block_pieces(df, topology)
+    traversals = block_traversals(pieces)
+    bin_seconds = bin_minutes * 60
+
+    def to_time(seconds):
+        return origin + pd.to_timedelta(seconds, unit='s')
+
+    complete = traversals[traversals['complete']]
+    exits = complete.assign(bin=np.floor(complete['end'] / bin_seconds).astype(np.int64))
+    throughput = exits.groupby(['bin', 'block', 'line']).size().rename('trains').reset_index()
+    throughput['trains_per_hour'] = throughput['trains'] * 60 / bin_minutes
+
+    running = complete.assign(minutes=(complete['end'] - complete['start']) / 60)
+    running_time = (running.groupby(['block', 'line'])['minutes']
+                    .agg(mean_running_time_minutes='mean', traversals='size').reset_index())
+
+    # Split the occupied intervals across the time bins they cover
+    occupied = _occupied_intervals(traversals)
+    first_bin = np.floor(occupied['start'].to_numpy() / bin_seconds).astype(np.int64)
+    last_bin = np.maximum(np.ceil(occupied['end'].to_numpy() / bin_seconds).astype(np.int64) - 1, first_bin)
+    spans = last_bin - first_bin + 1
+    row = np.repeat(np.arange(len(occupied)), spans)
+    bins = np.repeat(first_bin, spans) + np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    seconds = (np.minimum(occupied['end'].to_numpy()[row], (bins + 1) * bin_seconds)
+               - np.maximum(occupied['start'].to_numpy()[row], bins * bin_seconds))
+    occupancy = (pd.DataFrame({'bin': bins, 'block': occupied['block'].to_numpy()[row],
+                               'line': occupied['line'].to_numpy()[row], 'seconds': seconds})
+                 .groupby(['bin', 'block', 'line'])['seconds'].sum().reset_index())
+    occupancy['occupancy_ratio'] = occupancy['seconds'] / bin_seconds
+
+    for frame in (throughput, occupancy):
+        frame.insert(0, 'bin_start', to_time(frame.pop('bin') * bin_seconds))
+    for frame in (traversals, throughput, occupancy, running_time):
+        frame['block'] = pd.Categorical.from_codes(frame['block'].to_numpy(), categories=names)
+    traversals['start'] = to_time(traversals['start'])
+    traversals['end'] = to_time(traversals['end'])
+
+    return {
+        'traversals': traversals,
+        'throughput': throughput,
+        'occupancy': occupancy.drop(columns='seconds'),
+        'running_time': running_time,
+    }
+
+
+def throughput_summary(metrics: Dict[str, pd.DataFrame]) -> Dict:
+    """Headline numbers for generate_optimization_report"""
+    throughput = metrics['throughput']
+    occupancy = metrics['occupancy']
+    running_time = metrics['running_time']
+    n_bins = max(throughput['bin_start'].nunique(), occupancy['bin_start'].nunique(), 1)
+
+    per_block = throughput.groupby('block', observed=True)['trains_per_hour'].sum() / n_bins
+    per_line = throughput.groupby('line')['trains_per_hour'].sum() / n_bins
+    hourly = throughput.groupby('bin_start')['trains_per_hour'].sum()
+    total_minutes = running_time['mean_running_time_minutes'] * running_time['traversals']
+    mean_running = (total_minutes.groupby(running_time['block'], observed=True).sum()
+                    / running_time.groupby('block', observed=True)['traversals'].sum())
+    mean_occupancy = (occupancy.groupby('block', observed=True)['occupancy_ratio'].sum()
+                      / (n_bins * max(occupancy['line'].nunique(), 1)))
+
+    blocks = list(occupancy['block'].cat.categories)  # corridor order
+    return {
+        'blocks': {
+            block: {
+                'trains_per_hour': float(per_block.get(block, 0.0)),
+                'mean_running_time_minutes': float(mean_running.get(block, float('nan'))),
+                'occupancy_ratio': float(mean_occupancy.get(block, 0.0)),
+            }
+            for block in blocks
+        },
+        'trains_per_hour_by_line': {line: float(value) for line, value in per_line.items()},
+        'peak_trains_per_hour': float(hourly.max()) if len(hourly) else 0.0,
+        'completed_traversals': int(metrics['traversals']['complete'].sum()),
+    }
@@ -0,0 +1,181 @@
+"""
+Time-Space (Marey) Diagram Builder
+==================================
+
+Builds per-train position/time polylines from the simulation time series and
+decimates them for display:
+- Douglas-Peucker importance is precomputed once per train, so any error
+  tolerance can be selected later with a single mask
+- The tolerance is picked per zoom window so that only a bounded number of
+  points reaches the browser
+- Headway violations from RailwayOptimizer.detect_conflicts can be overlaid
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+
+def douglas_peucker_importance(times: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Return the Douglas-Peucker importance (metres) of every point of one polyline.
+
+    A point with importance > tolerance is exactly the set of points kept by
+    Douglas-Peucker at that tolerance; the end points are always kept.
+    """
+    n = len(times)
+    importance = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+
+    # Each stack entry is (start, end, importance of the split that created it)
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        start, end, parent_importance = stack.pop()
+        if end - start < 2:
+            continue
+
+        t0, t1 = times[start], times[end]
+        p0, p1 = positions[start], positions[end]
+        inner_t = times[start + 1:end]
+        if t1 > t0:
+            chord = p0 + (p1 - p0) * (inner_t - t0) / (t1 - t0)
+        else:
+            chord = np.full(len(inner_t), p0)
+        deviation = np.abs(positions[start + 1:end] - chord)
+
+        split = int(np.argmax(deviation))
+        split_importance = min(float(deviation[split]), parent_importance)
+        split += start + 1
+        importance[split] = split_importance
+
+        stack.append((start, split, split_importance))
+        stack.append((split, end, split_importance))
+
+    return importance
+
+
+class TimeSpaceIndex:
+    """Precomputed per-train polylines for the time-space diagram"""
+
+    def __init__(self, train_ids: np.ndarray, train_types: np.ndarray, offsets: np.ndarray,
+                 times: np.ndarray, positions: np.ndarray, importance: np.ndarray):
+        self.train_ids = train_ids
+        self.train_types = train_types
+        self.offsets = offsets  # polyline i spans rows offsets[i]:offsets[i + 1]
+        self.times = times  # int64 epoch seconds
+        self.positions = positions
+        self.importance = importance
+
+        # Row -> polyline number, used to keep window edges within one train
+        self.row_train = np.repeat(np.arange(len(train_ids)), np.diff(offsets))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'TimeSpaceIndex':
+        """Build the index from a simulation frame (timestamp, train_id, train_type, position_m)"""
+        frame = df[['timestamp', 'train_id', 'train_type', 'position_m']].copy()
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        frame = frame.sort_values(['train_id', 'timestamp'], kind='stable')
+
+        times = frame['timestamp'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+        positions = frame['position_m'].to_numpy(dtype=np.float64)
+        train_col = frame['train_id'].to_numpy()
+
+        starts = np.flatnonzero(np.r_[True, train_col[1:] != train_col[:-1]]) if len(train_col) else np.array([], dtype=np.int64)
+        offsets = np.r_[starts, len(train_col)].astype(np.int64)
+
+        importance = np.empty(len(times), dtype=np.float64)
+        for i in range(len(starts)):
+            lo, hi = offsets[i], offsets[i + 1]
+            importance[lo:hi] = douglas_peucker_importance(times[lo:hi], positions[lo:hi])
+
+        return cls(
+            train_ids=train_col[starts],
+            train_types=frame['train_type'].to_numpy()[starts],
+            offsets=offsets,
+            times=times,
+            positions=positions,
+            importance=importance
+        )
+
+    @property
+    def time_range(self) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        if not len(self.times):
+            return None, None
+        return (pd.Timestamp(self.times.min(), unit='s'), pd.Timestamp(self.times.max(), unit='s'))
+
+    def select(self, start=None, end=None, max_points: int = 5000,
+               train_types: Optional[List[str]] = None) -> Tuple[np.ndarray, float]:
+        """Pick the rows to draw for a zoom window.
+
+        Returns the selected row indices (ordered by train, then time) and the
+        Douglas-Peucker tolerance in metres that was needed to stay within
+        max_points.
+        """
+        visible = np.ones(len(self.times), dtype=bool)
+        if start is not None:
+            visible &= self.times >= pd.Timestamp(start).value // 10**9
+        if end is not None:
+            visible &= self.times <= pd.Timestamp(end).value // 10**9
+
+        # Keep one point either side of the window so lines run to the edges
+        same_train = self.row_train[1:] == self.row_train[:-1]
+        visible = visible | np.r_[visible[1:] & same_train, False] | np.r_[False, visible[:-1] & same_train]
+
+        if train_types is not None:
+            visible &= np.isin(self.train_types[self.row_train], train_types)
+
+        candidates = np.flatnonzero(visible)
+        if len(candidates) <= max_points:
+            return candidates, 0.0
+
+        # Window edges behave like polyline end points
+        has_prev = np.r_[False, visible[:-1] & same_train]
+        has_next = np.r_[visible[1:] & same_train, False]
+        edge = ~(has_prev & has_next)[candidates]
+        importance = np.where(edge, np.inf, self.importance[candidates])
+
+        budget = max(max_points, int(edge.sum()))
+        tolerance = float(np.partition(importance, len(importance) - budget)[len(importance) - budget])
+        if not np.isfinite(tolerance):
+            return candidates[edge], tolerance
+        return candidates[importance > tolerance], tolerance
+
+    def polylines(self, rows: np.ndarray) -> Dict[str, Dict[str, list]]:
+        """Group selected rows into per-train-type traces with breaks between trains"""
+        traces = {}
+        if len(rows) == 0:
+            return traces
+
+        row_train = self.row_train[rows]
+        breaks = np.flatnonzero(row_train[1:] != row_train[:-1]) + 1
+        for segment in np.split(rows, breaks):
+            train = self.row_train[segment[0]]
+            trace = traces.setdefault(str(self.train_types[train]), {'x': [], 'y': [], 'text': []})
+            trace['x'].extend(pd.to_datetime(self.times[segment], unit='s'))
+            trace['y'].extend(self.positions[segment].tolist())
+            trace['text'].extend([self.train_ids[train]] * len(segment))
+            # None breaks the line between consecutive trains of one trace
+            trace['x'].append(None)
+            trace['y'].append(None)
+            trace['text'].append(None)
+
+        return traces
+
+
+def conflict_markers(conflicts: List[Dict]) -> pd.DataFrame:
+    """Tabulate headway violations from detect_conflicts for plotting"""
+    rows = []
+    for conflict in conflicts:
+        if conflict.get('type') != 'headway_violation':
+            continue
+        line = conflict['line']
+        rows.append({
+            'timestamp': pd.Timestamp(conflict['timestamp']),
+            'position_m': conflict.get('position', np.nan),
+            'line': getattr(line, 'value', line),
+            'trains': ' / '.join(conflict['trains']),
+            'distance': conflict['distance'],
+        })
+
+    return pd.DataFrame(rows, columns=['timestamp', 'position_m', 'line', 'trains', 'distance'])
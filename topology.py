@@ -0,0 +1,121 @@
+"""
+Network Topology
+================
+
+Loads the corridor layout shared by the optimizer and the generators from
+a JSON file (topology.json next to this module by default):
+- sections: named position ranges with the lines that exist in them
+- stations: name, position and platform count
+- crossovers: which line a train can switch to from each line, optionally
+  overridden per section
+
+Sections are also the unit of partitioned optimization (partitioned.py).
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from main import Station, LineType
+
+DEFAULT_TOPOLOGY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topology.json')
+
+
+@dataclass
+class Section:
+    name: str
+    start: float
+    end: float
+    lines: List[LineType]
+    crossovers: Dict[LineType, List[LineType]] = field(default_factory=dict)
+
+    def contains(self, position: float) -> bool:
+        return self.start <= position < self.end
+
+
+@dataclass
+class Topology:
+    name: str
+    sections: List[Section]
+    stations: List[Dict]
+    crossovers: Dict[LineType, List[LineType]]
+
+    @property
+    def track_length(self) -> float:
+        return max(section.end for section in self.sections)
+
+    @property
+    def lines(self) -> List[LineType]:
+        """Every line used by any section, in LineType order"""
+        used = {line for section in self.sections for line in section.lines}
+        return [line for line in LineType if line in used]
+
+    def build_stations(self) -> Dict[str, Station]:
+        """Fresh Station objects (with empty platforms) for an optimizer"""
+        return {spec['name']: Station(spec['name'], spec['position'], platforms=spec['platforms'])
+                for spec in self.stations}
+
+    def section_index(self, position: float) -> int:
+        """Index of the section containing position, clamped to the ends of the network"""
+        for i, section in enumerate(self.sections):
+            if section.contains(position):
+                return i
+        return 0 if position < self.sections[0].start else len(self.sections) - 1
+
+    def section_indices(self, positions: np.ndarray) -> np.ndarray:
+        """section_index for an array of positions"""
+        return np.searchsorted(np.array(self.boundaries(), dtype=np.float64), positions, side='right')
+
+    def boundaries(self) -> List[float]:
+        """Positions where one section hands over to the next"""
+        return [section.start for section in self.sections[1:]]
+
+    def section_at(self, position: float) -> Section:
+        return self.sections[self.section_index(position)]
+
+    def alternative_lines(self, line: LineType, position: Optional[float] = None) -> List[LineType]:
+        """Lines reachable from line by a crossover, limited to the section at position"""
+        if position is None:
+            return list(self.crossovers.get(line, []))
+        section = self.section_at(position)
+        links = section.crossovers.get(line, self.crossovers.get(line, []))
+        return [alt for alt in links if alt in section.lines]
+
+
+def _crossovers(spec: Dict) -> Dict[LineType, List[LineType]]:
+    return {LineType(line): [LineType(alt) for alt in alts] for line, alts in spec.items()}
+
+
+def load_topology(path: Optional[str] = None) -> Topology:
+    """Read and validate a topology file"""
+    path = path or DEFAULT_TOPOLOGY
+    with open(path) as f:
+        spec = json.load(f)
+
+    sections = [
+        Section(
+            name=section['name'],
+            start=float(section['start']),
+            end=float(section['end']),
+            lines=[LineType(line) for line in section['lines']],
+            crossovers=_crossovers(section.get('crossovers', {}))
+        )
+        for section in spec['sections']
+    ]
+    if not sections:
+        raise ValueError(f"{path}: topology has no sections")
+    sections.sort(key=lambda section: section.start)
+    for before, after in zip(sections, sections[1:]):
+        if before.end != after.start:
+            raise ValueError(f"{path}: sections {before.name!r} and {after.name!r} are not contiguous")
+
+    stations = sorted(spec['stations'], key=lambda station: station['position'])
+    return Topology(
+        name=spec.get('name', os.path.basename(path)),
+        sections=sections,
+        stations=stations,
+        crossovers=_crossovers(spec.get('crossovers', {}))
+    )
@@ -0,0 +1,413 @@
+"""
+Columnar Fleet State
+====================
+
+Struct-of-arrays storage for the optimizer's trains:
+- Enum fields are int8 codes, positions/speeds/delays float64 columns and
+  datetimes int64 epoch nanoseconds (NaT for missing)
+- Route history is a ragged int8 matrix with a per-train length column
+- TrainRow is a __slots__ view that exposes the Train attributes on top of
+  one table row, so existing optimizer code keeps working unchanged
+- TrainTable behaves like the Dict[str, Train] that RailwayOptimizer.trains
+  used to be, and exposes its columns for vectorized stages
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional
+
+from main import Train, LineType, EventType
+from encoding import TRAIN_TYPES, LINES, EVENTS, TRAIN_TYPE_CODES, LINE_CODES, EVENT_CODES, CONFIGS
+
+_NAT = np.iinfo(np.int64).min
+
+
+def _to_ns(value) -> int:
+    return _NAT if value is None else pd.Timestamp(value).value
+
+
+def _from_ns(value: int):
+    return None if value == _NAT else pd.Timestamp(value)
+
+
+class RouteHistoryView:
+    """List-like view of one train's route history"""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: 'TrainTable', row: int):
+        self._table = table
+        self._row = row
+
+    def __len__(self) -> int:
+        return int(self._table.route_length[self._row])
+
+    def __getitem__(self, index):
+        codes = self._table.route_codes[self._row, :len(self)]
+        if isinstance(index, slice):
+            return [LINES[code] for code in codes[index]]
+        return LINES[codes[index]]
+
+    def __iter__(self) -> Iterator[LineType]:
+        return (LINES[code] for code in self._table.route_codes[self._row, :len(self)])
+
+    def __contains__(self, line) -> bool:
+        return bool((self._table.route_codes[self._row, :len(self)] == LINE_CODES[line]).any())
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def append(self, line: LineType):
+        self._table._append_route(self._row, LINE_CODES[line])
+
+
+class TrainRow:
+    """Train-compatible view of one TrainTable row"""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: 'TrainTable', row: int):
+        self._table = table
+        self._row = row
+
+    train_id = property(lambda self: self._table.train_ids[self._row])
+    train_type = property(lambda self: TRAIN_TYPES[self._table.train_type[self._row]])
+    config = property(lambda self: CONFIGS[self._table.train_type[self._row]])
+    route_history = property(lambda self: RouteHistoryView(self._table, self._row))
+
+    @property
+    def current_position(self) -> float:
+        return float(self._table.position[self._row])
+
+    @current_position.setter
+    def current_position(self, value: float):
+        self._table.position[self._row] = value
+
+    @property
+    def current_speed(self) -> float:
+        return float(self._table.speed[self._row])
+
+    @current_speed.setter
+    def current_speed(self, value: float):
+        self._table.speed[self._row] = value
+
+    @property
+    def current_line(self) -> LineType:
+        return LINES[self._table.line[self._row]]
+
+    @current_line.setter
+    def current_line(self, value: LineType):
+        self._table.line[self._row] = LINE_CODES[value]
+
+    @property
+    def event(self) -> EventType:
+        return EVENTS[self._table.event[self._row]]
+
+    @event.setter
+    def event(self, value: EventType):
+        self._table.event[self._row] = EVENT_CODES[value]
+
+    @property
+    def delay_minutes(self) -> float:
+        return float(self._table.delay_minutes[self._row])
+
+    @delay_minutes.setter
+    def delay_minutes(self, value: float):
+        self._table.delay_minutes[self._row] = value
+
+    @property
+    def disruption_factor(self) -> float:
+        return float(self._table.disruption_factor[self._row])
+
+    @disruption_factor.setter
+    def disruption_factor(self, value: float):
+        self._table.disruption_factor[self._row] = value
+
+    @property
+    def station(self) -> Optional[str]:
+        code = self._table.station[self._row]
+        return None if code < 0 else self._table.station_names[code]
+
+    @station.setter
+    def station(self, value: Optional[str]):
+        self._table.station[self._row] = self._table._station_code(value)
+
+    @property
+    def platform_assigned(self) -> Optional[int]:
+        platform = self._table.platform[self._row]
+        return None if platform < 0 else int(platform)
+
+    @platform_assigned.setter
+    def platform_assigned(self, value: Optional[int]):
+        self._table.platform[self._row] = -1 if value is None else value
+
+    @property
+    def timestamp(self):
+        return _from_ns(self._table.timestamp[self._row])
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self._table.timestamp[self._row] = _to_ns(value)
+
+    @property
+    def scheduled_arrival(self):
+        return _from_ns(self._table.scheduled_arrival[self._row])
+
+    @scheduled_arrival.setter
+    def scheduled_arrival(self, value):
+        self._table.scheduled_arrival[self._row] = _to_ns(value)
+
+    @property
+    def actual_arrival(self):
+        return _from_ns(self._table.actual_arrival[self._row])
+
+    @actual_arrival.setter
+    def actual_arrival(self, value):
+        self._table.actual_arrival[self._row] = _to_ns(value)
+
+    @property
+    def scheduled_departure(self):
+        return _from_ns(self._table.scheduled_departure[self._row])
+
+    @scheduled_departure.setter
+    def scheduled_departure(self, value):
+        self._table.scheduled_departure[self._row] = _to_ns(value)
+
+    @property
+    def actual_departure(self):
+        return _from_ns(self._table.actual_departure[self._row])
+
+    @actual_departure.setter
+    def actual_departure(self, value):
+        self._table.actual_departure[self._row] = _to_ns(value)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TrainRow) and other._table is self._table and other._row == self._row
+
+    def __hash__(self) -> int:
+        return hash((id(self._table), self._row))
+
+    def __repr__(self) -> str:
+        return f"TrainRow({self.train_id!r}, {self.train_type.value}, {self.current_line.value}, {self.event.value})"
+
+
+class TrainTable:
+    """Fleet state held in typed NumPy columns, keyed by train id like a dict"""
+
+    _COLUMNS = {
+        'train_type': np.int8,
+        'line': np.int8,
+        'event': np.int8,
+        'station': np.int16,
+        'platform': np.int16,
+        'position': np.float64,
+        'speed': np.float64,
+        'delay_minutes': np.float64,
+        'disruption_factor': np.float64,
+        'timestamp': np.int64,
+        'scheduled_arrival': np.int64,
+        'actual_arrival': np.int64,
+        'scheduled_departure': np.int64,
+        'actual_departure': np.int64,
+        'route_length': np.int16,
+    }
+
+    def __init__(self, capacity: int = 64, route_capacity: int = 4):
+        self._size = 0
+        self._index: Dict[str, int] = {}
+        self.train_ids = np.empty(capacity, dtype=object)
+        for name, dtype in self._COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.route_codes = np.zeros((capacity, route_capacity), dtype=np.int8)
+        self.station_names: List[str] = []
+        self._station_index: Dict[str, int] = {}
+
+    @classmethod
+    def from_trains(cls, trains) -> 'TrainTable':
+        table = cls(capacity=max(len(trains), 1))
+        for train in trains.values():
+            table.add(train)
+        return table
+
+    def to_trains(self) -> Dict[str, Train]:
+        """Materialize regular Train objects (e.g. for code that pickles them)"""
+        def timestamps(name):
+            return [_from_ns(value) for value in self.column(name).tolist()]
+
+        def enums(name, members):
+            return [members[code] for code in self.column(name).tolist()]
+
+        columns = zip(
+            self.train_ids[:self._size].tolist(), enums('train_type', TRAIN_TYPES),
+            self.column('position').tolist(), self.column('speed').tolist(), enums('line', LINES),
+            timestamps('scheduled_arrival'), timestamps('actual_arrival'),
+            timestamps('scheduled_departure'), timestamps('actual_departure'),
+            self.column('delay_minutes').tolist(),
+            [None if code < 0 else self.station_names[code] for code in self.column('station').tolist()],
+            enums('event', EVENTS), timestamps('timestamp'),
+            [None if platform < 0 else platform for platform in self.column('platform').tolist()],
+            [[LINES[code] for code in codes[:length]]
+             for codes, length in zip(self.route_codes[:self._size].tolist(), self.column('route_length').tolist())],
+            self.column('disruption_factor').tolist(),
+        )
+        trains = {}
+        for (train_id, train_type, position, speed, line, scheduled_arrival, actual_arrival,
+             scheduled_departure, actual_departure, delay, station, event, timestamp,
+             platform, route_history, disruption_factor) in columns:
+            trains[train_id] = Train(
+                train_id=train_id,
+                train_type=train_type,
+                current_position=position,
+                current_speed=speed,
+                current_line=line,
+                scheduled_arrival=scheduled_arrival,
+                actual_arrival=actual_arrival,
+                scheduled_departure=scheduled_departure,
+                actual_departure=actual_departure,
+                delay_minutes=delay,
+                station=station,
+                event=event,
+                timestamp=timestamp,
+                platform_assigned=platform,
+                route_history=route_history,
+                disruption_factor=disruption_factor
+            )
+        return trains
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """Trimmed column arrays without object dtypes (ids as fixed-width strings), e.g. for checkpoints"""
+        columns = {name: self.column(name) for name in self._COLUMNS}
+        columns['train_ids'] = self.train_ids[:self._size].astype(str)
+        columns['route_codes'] = self.route_codes[:self._size]
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray], station_names: List[str]) -> 'TrainTable':
+        """Inverse of to_columns"""
+        size = len(columns['train_ids'])
+        table = cls(capacity=max(size, 1), route_capacity=max(columns['route_codes'].shape[1], 1))
+        table._size = size
+        table.train_ids[:size] = [str(train_id) for train_id in columns['train_ids']]
+        table._index = {train_id: row for row, train_id in enumerate(table.train_ids[:size])}
+        for name in cls._COLUMNS:
+            getattr(table, name)[:size] = columns[name]
+        table.route_codes[:size, :columns['route_codes'].shape[1]] = columns['route_codes']
+        table.station_names = list(station_names)
+        table._station_index = {name: code for code, name in enumerate(table.station_names)}
+        return table
+
+    # Dict interface -----------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, train_id) -> bool:
+        return train_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.train_ids[:self._size])
+
+    def __getitem__(self, train_id: str) -> TrainRow:
+        return TrainRow(self, self._index[train_id])
+
+    def __setitem__(self, train_id: str, train: Train):
+        if train_id in self._index:
+            raise KeyError(f"Train {train_id} already in table")
+        self.add(train)
+
+    def get(self, train_id: str, default=None):
+        row = self._index.get(train_id)
+        return default if row is None else TrainRow(self, row)
+
+    def keys(self):
+        return list(self)
+
+    def values(self) -> List[TrainRow]:
+        return [TrainRow(self, row) for row in range(self._size)]
+
+    def items(self):
+        return [(self.train_ids[row], TrainRow(self, row)) for row in range(self._size)]
+
+    # Columns ------------------------------------------------------------
+
+    def add(self, train: Train) -> TrainRow:
+        """Append a Train and return its row view"""
+        if self._size == len(self.train_ids):
+            self._grow(2 * self._size)
+        row = self._size
+        self._size += 1
+        self._index[train.train_id] = row
+
+        self.train_ids[row] = train.train_id
+        self.train_type[row] = TRAIN_TYPE_CODES[train.train_type]
+        self.route_length[row] = 0
+        view = TrainRow(self, row)
+        for name in ('current_position', 'current_speed', 'current_line', 'event', 'delay_minutes',
+                     'disruption_factor', 'station', 'platform_assigned', 'timestamp', 'scheduled_arrival',
+                     'actual_arrival', 'scheduled_departure', 'actual_departure'):
+            setattr(view, name, getattr(train, name))
+        for line in train.route_history:
+            view.route_history.append(line)
+        return view
+
+    def column(self, name: str) -> np.ndarray:
+        """Live view of a column trimmed to the number of trains"""
+        return getattr(self, name)[:self._size]
+
+    @staticmethod
+    def rows_of(views: List[TrainRow]) -> np.ndarray:
+        """Row numbers behind a list of row views"""
+        return np.fromiter((view._row for view in views), dtype=np.int64, count=len(views))
+
+    def route_mask(self, rows: np.ndarray) -> np.ndarray:
+        """(len(rows), len(LINES)) mask of the lines in each train's route history"""
+        lengths = self.route_length[rows]
+        codes = self.route_codes[rows]
+        filled = np.arange(codes.shape[1])[None, :] < lengths[:, None]
+        mask = np.zeros((len(rows), len(LINES)), dtype=bool)
+        hit_rows, hit_slots = np.nonzero(filled)
+        mask[hit_rows, codes[hit_rows, hit_slots]] = True
+        return mask
+
+    def count_on_line(self, line: LineType, events: List[EventType]) -> int:
+        """Number of trains on a line whose event is one of events"""
+        event_codes = [EVENT_CODES[event] for event in events]
+        mask = (self.column('line') == LINE_CODES[line]) & np.isin(self.column('event'), event_codes)
+        return int(mask.sum())
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the table"""
+        total = self.route_codes[:self._size].nbytes + self._size * 8  # ids are shared str objects
+        for name in self._COLUMNS:
+            total += self.column(name).nbytes
+        return total
+
+    def _station_code(self, name: Optional[str]) -> int:
+        if name is None:
+            return -1
+        if name not in self._station_index:
+            self._station_index[name] = len(self.station_names)
+            self.station_names.append(name)
+        return self._station_index[name]
+
+    def _append_route(self, row: int, code: int):
+        length = self.route_length[row]
+        if length == self.route_codes.shape[1]:
+            wider = np.zeros((self.route_codes.shape[0], 2 * length), dtype=np.int8)
+            wider[:, :length] = self.route_codes
+            self.route_codes = wider
+        self.route_codes[row, length] = code
+        self.route_length[row] = length + 1
+
+    def _grow(self, capacity: int):
+        ids = np.empty(capacity, dtype=object)
+        ids[:self._size] = self.train_ids[:self._size]
+        self.train_ids = ids
+        for name in self._COLUMNS:
+            column = np.zeros(capacity, dtype=self._COLUMNS[name])
+            column[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, column)
+        route_codes = np.zeros((capacity, self.route_codes.shape[1]), dtype=np.int8)
+        route_codes[:self._size] = self.route_codes[:self._size]
+        self.route_codes = route_codes
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Trajectory Archive
+================================
+
+An on-disk binary form of a simulation time series, so the optimizer and
+the dashboard can slice it without parsing or copying:
+- One .npy file per COLUMN_LAYOUT column (fixed-width values and codes),
+  rows sorted by timestamp, plus meta.json with the data-driven categories
+- Time index: distinct timestamps and the row each one starts at, so a
+  time window is a contiguous row range
+- Train index: row numbers grouped by train (time order within a train)
+  and per-train offsets into it
+- Files are opened with np.load(mmap_mode='r'), so every process reading
+  the same archive shares its pages through the OS page cache
+- Archives are staged in a temporary directory and swapped in; an existing
+  path is only replaced when its meta.json names the same format and
+  version (so an archive never replaces a change log, or vice versa)
+
+window() returns frames whose numeric and code columns are views of the
+mapped files; train() gathers only that train's rows.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from encoding import CSV_DTYPES, COLUMN_LAYOUT, frame_to_columns, columns_to_frame
+
+ARCHIVE_VERSION = 1
+ARCHIVE_FORMAT = 'trajectory_archive'
+ARCHIVE_SUFFIX = '.trajectory'
+
+
+def archive_path_for(csv_path: str) -> str:
+    """Default archive directory next to a simulation CSV"""
+    return os.path.splitext(csv_path)[0] + ARCHIVE_SUFFIX
+
+
+def _code_dtype(n_categories: int):
+    """Narrowest code dtype pandas keeps for this many categories, so codes map without a cast"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _directory_identity(path: str) -> Tuple[Optional[str], Optional[int]]:
+    """(format, version) from an output directory's meta.json, or (None, None)"""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return meta.get('format'), meta.get('version')
+    except (OSError, ValueError, AttributeError):
+        return None, None
+
+
+def read_meta(path: str, file_format: str, version: int) -> Dict:
+    """An output directory's meta.json; ValueError unless it has this format and version"""
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if (meta.get('format'), meta.get('version')) != (file_format, version):
+        raise ValueError(f"{path}: not a {file_format} version {version} directory "
+                         f"(found {meta.get('format')} version {meta.get('version')})")
+    return meta
+
+
+def check_replaceable(path: str, file_format: str, version: int):
+    """Raise FileExistsError unless path is missing or an output directory of this format and version"""
+    if os.path.lexists(path) and not (os.path.isdir(path)
+                                      and _directory_identity(path) == (file_format, version)):
+        raise FileExistsError(f"{os.path.abspath(path)} exists and is not a {file_format} version {version} "
+                              f"directory; refusing to replace it")
+
+
+def stage_directory(path: str, file_format: str, version: int) -> str:
+    """Empty staging directory next to path, once path is known to be safe to replace
+
+    path must be missing or a directory whose meta.json has this format
+    and version; anything else raises FileExistsError instead of being
+    overwritten.
+    """
+    path = os.path.abspath(path)
+    check_replaceable(path, file_format, version)
+    parent, name = os.path.split(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{name}.tmp-', dir=parent)
+    os.chmod(staging, 0o755)  # mkdtemp's 0700 would hide the result from other readers
+    return staging
+
+
+def swap_directory(staging: str, path: str):
+    """Move a completed staging directory into place; any previous one is renamed aside, then removed"""
+    aside = None
+    if os.path.lexists(path):
+        aside = f"{os.path.abspath(path)}.old-{os.getpid()}-{time.time_ns()}"
+        os.rename(path, aside)
+    try:
+        os.rename(staging, path)
+    except OSError:
+        if aside is not None:
+            os.rename(aside, path)
+        raise
+    if aside is not None:
+        shutil.rmtree(aside, ignore_errors=True)
+
+
+def write_archive(df: pd.DataFrame, path: str, source: Optional[str] = None) -> str:
+    """Write a simulation frame as an archive directory and return its path.
+
+    The archive is built in a temporary directory and renamed into place,
+    so readers never see a partial archive. An existing path is only
+    replaced if it is an archive (see stage_directory).
+    """
+    columns, categories = frame_to_columns(df)
+    order = np.argsort(columns['timestamp'], kind='stable')
+    columns = {name: values[order] for name, values in columns.items()}
+
+    times, time_offsets = np.unique(columns['timestamp'], return_index=True)
+    train_rows = np.argsort(columns['train_id'], kind='stable')
+    train_offsets = np.searchsorted(columns['train_id'][train_rows],
+                                    np.arange(len(categories['train_id']) + 1))
+
+    staging = stage_directory(path, ARCHIVE_FORMAT, ARCHIVE_VERSION)
+    try:
+        for name, dtype in COLUMN_LAYOUT:
+            if name in categories:
+                dtype = _code_dtype(len(categories[name]))
+            np.save(os.path.join(staging, f'{name}.npy'), columns[name].astype(dtype, copy=False))
+        np.save(os.path.join(staging, 'time_index.npy'), times)
+        np.save(os.path.join(staging, 'time_offsets.npy'), time_offsets.astype(np.int64))
+        np.save(os.path.join(staging, 'train_rows.npy'), train_rows.astype(np.int64))
+        np.save(os.path.join(staging, 'train_offsets.npy'), train_offsets.astype(np.int64))
+
+        meta = {'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION, 'rows': len(order), 'categories': categories}
+        if source is not None:
+            stat = os.stat(source)
+            meta['source'] = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    swap_directory(staging, path)
+    return path
+
+
+def build_archive(csv_path: str, path: Optional[str] = None) -> str:
+    """Convert a simulation CSV to an archive (next to it by default)"""
+    df = pd.read_csv(csv_path, dtype=CSV_DTYPES)
+    return write_archive(df, path or archive_path_for(csv_path), source=csv_path)
+
+
+class TrajectoryArchive:
+    """Read-only, memory-mapped view of an archive directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = read_meta(path, ARCHIVE_FORMAT, ARCHIVE_VERSION)
+        self.categories = self.meta['categories']
+
+        def mapped(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+        self.columns: Dict[str, np.ndarray] = {name: mapped(name) for name, _ in COLUMN_LAYOUT}
+        self.time_index = mapped('time_index')
+        self.time_offsets = mapped('time_offsets')
+        self.train_rows = mapped('train_rows')
+        self.train_offsets = mapped('train_offsets')
+        self._train_codes = {train_id: code for code, train_id in enumerate(self.categories['train_id'])}
+
+    @classmethod
+    def for_csv(cls, csv_path: str, path: Optional[str] = None) -> 'TrajectoryArchive':
+        """Open the archive of a CSV, (re)building it if missing or older than the CSV"""
+        path = path or archive_path_for(csv_path)
+        if not cls.is_current(path, csv_path):
+            build_archive(csv_path, path)
+        return cls(path)
+
+    @staticmethod
+    def is_current(path: str, csv_path: str) -> bool:
+        try:
+            source = read_meta(path, ARCHIVE_FORMAT, ARCHIVE_VERSION).get('source')
+        except (OSError, ValueError):
+            return False
+        stat = os.stat(csv_path)
+        return source is not None and source['size'] == stat.st_size and source['mtime'] == stat.st_mtime
+
+    def __len__(self) -> int:
+        return self.meta['rows']
+
+    @property
+    def time_range(self):
+        if not len(self.time_index):
+            return None, None
+        return pd.Timestamp(self.time_index[0]), pd.Timestamp(self.time_index[-1])
+
+    @property
+    def train_ids(self):
+        return list(self.categories['train_id'])
+
+    def rows_between(self, start=None, end=None) -> slice:
+        """Row range of timestamps in [start, end)"""
+        first = 0 if start is None else self._time_row(start)
+        last = len(self) if end is None else self._time_row(end)
+        return slice(first, max(first, last))
+
+    def _time_row(self, when) -> int:
+        value = pd.Timestamp(when).as_unit('ns').value
+        i = int(np.searchsorted(self.time_index, value, side='left'))
+        return int(self.time_offsets[i]) if i < len(self.time_index) else len(self)
+
+    def frame(self, rows=slice(None)) -> pd.DataFrame:
+        """Frame over a row slice (zero-copy) or an array of row numbers (gathered)"""
+        return columns_to_frame({name: values[rows] for name, values in self.columns.items()}, self.categories)
+
+    def window(self, start=None, end=None) -> pd.DataFrame:
+        """Records with start <= timestamp < end, as views of the mapped columns"""
+        return self.frame(self.rows_between(start, end))
+
+    def train(self, train_id: str, start=None, end=None) -> pd.DataFrame:
+        """One train's records in time order, optionally limited to [start, end)"""
+        code = self._train_codes.get(train_id)
+        if code is None:
+            return self.frame(slice(0, 0))
+        rows = self.train_rows[self.train_offsets[code]:self.train_offsets[code + 1]]
+        window = self.rows_between(start, end)
+        rows = rows[(rows >= window.start) & (rows < window.stop)]
+        return self.frame(np.asarray(rows))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a simulation CSV to a memory-mapped trajectory archive")
+    parser.add_argument('input', help="simulation CSV")
+    parser.add_argument('--output', default=None, help=f"archive directory (default: <input>{ARCHIVE_SUFFIX})")
+    args = parser.parse_args()
+
+    try:
+        path = build_archive(args.input, args.output)
+    except FileExistsError as e:
+        parser.error(str(e))
+    archive = TrajectoryArchive(path)
+    first, last = archive.time_range
+    print(f" Archived {len(archive)} records of {len(archive.train_ids)} trains to {path}")
+    print(f"  Time range: {first} - {last}")
+    print(f"  Column data: {archive.nbytes / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()